@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+
+class CacheEntry:
+    """Cached response with its validators"""
+    __slots__ = ("response", "expires", "etag", "last_modified", "size")
+
+    def __init__(self, response, ttl: float, etag: str = None, last_modified: str = None, size: int = 0):
+        self.response = response
+        self.expires = time.monotonic() + ttl
+        self.etag = etag
+        self.last_modified = last_modified
+        self.size = size
+
+    def fresh(self) -> bool:
+        return time.monotonic() < self.expires
+
+    def refresh(self, ttl: float) -> None:
+        self.expires = time.monotonic() + ttl
+
+    def validators(self) -> dict:
+        """Headers for conditional revalidation of stale entry"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+
+        return headers
+
+
+class ResponseCache:
+    """Size bounded LRU cache of GET responses with per-endpoint TTL..
+    Stale entries are kept for conditional revalidation (ETag / If-Modified-Since)
+    until evicted. Subclass it to store responses elsewhere.\n
+
+    :ttls: Url part -> TTL in seconds, urls without match are not cached.\n
+    :max_entries: Max count of cached responses.\n
+    :max_bytes: Max total size of cached bodies.\n
+    """
+    TTLS = {
+        "/guest/prices": 60,
+        "/guest/products/": 60,
+        "/guest/countries": 3600,
+        "/guest/flash/": 300,
+    }
+
+    def __init__(self, ttls: dict = None, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024):
+        self.ttls = self.TTLS if ttls is None else ttls
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self.entries = OrderedDict()
+        self.size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def ttl(self, url: str) -> float:
+        """TTL of endpoint, 0 - not cached"""
+        for part, ttl in self.ttls.items():
+            if part in url:
+                return ttl
+
+        return 0
+
+    def key(self, url: str, params: dict = None) -> str:
+        if not params:
+            return url
+
+        return url + "?" + urlencode(sorted((k, str(v)) for k, v in params.items()))
+
+    def get(self, key: str) -> CacheEntry:
+        """Returns entry (fresh or stale) or None"""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+
+            return entry
+
+    def set(self, key: str, entry: CacheEntry) -> None:
+        if entry.size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old.size
+
+            self.entries[key] = entry
+            self.size += entry.size
+
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, old = self.entries.popitem(last=False)
+                self.size -= old.size
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+            self.size = 0
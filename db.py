@@ -0,0 +1,250 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+
+from pysim.logger import log
+
+# order fields stored in own columns
+FIELDS = ("id", "phone", "operator", "product", "country", "price", "status", "expires", "created_at")
+
+# statuses of orders that still may change
+OPEN = ("PENDING", "RECEIVED")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    id          INTEGER PRIMARY KEY,
+    phone       TEXT,
+    operator    TEXT,
+    product     TEXT,
+    country     TEXT,
+    price       REAL,
+    status      TEXT,
+    expires     TEXT,
+    created_at  TEXT,
+    updated_at  REAL,
+    data        TEXT
+);
+CREATE INDEX IF NOT EXISTS orders_phone ON orders (phone);
+CREATE INDEX IF NOT EXISTS orders_product ON orders (product);
+CREATE INDEX IF NOT EXISTS orders_status ON orders (status);
+CREATE INDEX IF NOT EXISTS orders_created_at ON orders (created_at);
+
+CREATE TABLE IF NOT EXISTS transitions (
+    order_id    INTEGER NOT NULL,
+    status      TEXT,
+    at          REAL
+);
+CREATE INDEX IF NOT EXISTS transitions_order_id ON transitions (order_id);
+
+CREATE TABLE IF NOT EXISTS sms (
+    order_id    INTEGER NOT NULL,
+    position    INTEGER NOT NULL,
+    id          INTEGER,
+    created_at  TEXT,
+    date        TEXT,
+    sender      TEXT,
+    text        TEXT,
+    code        TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS sms_order_id ON sms (order_id, position);
+"""
+
+UPSERT_ORDER = """
+INSERT INTO orders (id, phone, operator, product, country, price, status, expires, created_at, updated_at, data)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (id) DO UPDATE SET
+    phone = COALESCE(excluded.phone, phone),
+    operator = COALESCE(excluded.operator, operator),
+    product = COALESCE(excluded.product, product),
+    country = COALESCE(excluded.country, country),
+    price = COALESCE(excluded.price, price),
+    status = excluded.status,
+    expires = COALESCE(excluded.expires, expires),
+    created_at = COALESCE(excluded.created_at, created_at),
+    updated_at = excluded.updated_at,
+    data = excluded.data
+"""
+
+# sms of order are keyed by position in order.sms, which only grows, as sms id may be missing
+INSERT_SMS = "INSERT OR IGNORE INTO sms (order_id, position, id, created_at, date, sender, text, code) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+
+INSERT_TRANSITION = "INSERT INTO transitions (order_id, status, at) VALUES (?, ?, ?)"
+
+
+def snapshot(order) -> dict:
+    """Plain dict copy of :class:`SimOrder`, safe to keep while order changes in place"""
+    data = {name: getattr(order, name, None) for name in FIELDS}
+    data["sms"] = [dict(sms) for sms in getattr(order, "sms", None) or ()]
+
+    return data
+
+
+class OrderStore:
+    """Local SQLite store of orders and their SMS..
+    Every recorded :class:`SimOrder` state is queued and written in batches by background thread,
+    database runs in WAL mode so reads do not wait for writes.\n
+
+    :path: Database file.\n
+    :batch_size: Max orders written in one transaction.\n
+    :interval: Max delay of queued write, in seconds.\n
+    """
+    def __init__(self, path: str = "pysim.db", batch_size: int = 500, interval: float = 0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.interval = interval
+
+        self.queue = queue.Queue()
+        self.statuses = {} # order id -> last written status
+
+        self.reader = self._connect()
+        self.reader.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+        # open orders of previous runs, so their next state is not taken for a transition
+        for row in self._query(f"SELECT id, status FROM orders WHERE status IN ({', '.join('?' * len(OPEN))})", *OPEN):
+            self.statuses[row["id"]] = row["status"]
+
+        self.writer = threading.Thread(target=self._write_loop, name="OrderStore", daemon=True)
+        self.writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.row_factory = sqlite3.Row
+
+        return connection
+
+    # < Writes >
+
+    def record(self, order) -> None:
+        """Queue current state of :class:`SimOrder` for writing"""
+        self.queue.put((snapshot(order), time.time()))
+
+    def flush(self) -> None:
+        """Wait until all queued states are written"""
+        self.queue.join()
+
+    def close(self) -> None:
+        self.queue.put(None)
+        self.writer.join()
+        self.reader.close()
+
+    def _write_loop(self) -> None:
+        connection = self._connect()
+        while True:
+            item = self.queue.get()
+            batch = [item]
+            deadline = time.monotonic() + self.interval
+            while item is not None and len(batch) < self.batch_size:
+                try:
+                    item = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                batch.append(item)
+
+            states = [item for item in batch if item is not None]
+            try:
+                if states:
+                    self._write(connection, states)
+            except Exception as error:
+                log.error(f"OrderStore write of {len(states)} orders failed: {error!r}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+            if len(states) != len(batch): # close() was called
+                connection.close()
+                return
+
+    def _write(self, connection: sqlite3.Connection, states: list) -> None:
+        orders, sms, transitions = [], [], []
+        for order, at in states:
+            if order["id"] is None:
+                continue
+
+            orders.append(tuple(order[name] for name in FIELDS) + (at, json.dumps(order, default=str)))
+            sms.extend(
+                (order["id"], position, item.get("id"), item.get("created_at"), item.get("date"), item.get("sender"), item.get("text"), item.get("code"))
+                for position, item in enumerate(order["sms"]))
+
+            if self.statuses.get(order["id"]) != order["status"]:
+                transitions.append((order["id"], order["status"], at))
+                if order["status"] in OPEN:
+                    self.statuses[order["id"]] = order["status"]
+                else:
+                    self.statuses.pop(order["id"], None)
+
+        try:
+            self._commit(connection, orders, sms, transitions)
+        except sqlite3.Error as error:
+            if len(orders) < 2:
+                raise
+            # write orders of failed batch one by one, so one bad row does not drop the others
+            log.warning(f"OrderStore batch of {len(orders)} orders failed: {error!r}, retrying one by one")
+            for id in dict.fromkeys(order[0] for order in orders):
+                try:
+                    self._commit(connection, *(
+                        [item for item in rows if item[0] == id] for rows in (orders, sms, transitions)))
+                except sqlite3.Error as error:
+                    log.error(f"OrderStore write of order {id} failed: {error!r}")
+
+    @staticmethod
+    def _commit(connection: sqlite3.Connection, orders: list, sms: list, transitions: list) -> None:
+        connection.execute("BEGIN")
+        try:
+            connection.executemany(UPSERT_ORDER, orders)
+            connection.executemany(INSERT_SMS, sms)
+            connection.executemany(INSERT_TRANSITION, transitions)
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    # < END Writes >
+
+    # < Queries >
+
+    def _query(self, sql: str, *params) -> list:
+        with self._lock:
+            return [dict(row) for row in self.reader.execute(sql, params)]
+
+    def order(self, id: int) -> dict:
+        """Last stored state of order or None"""
+        rows = self._query("SELECT data FROM orders WHERE id = ?", id)
+        return json.loads(rows[0]["data"]) if rows else None
+
+    def open_orders(self) -> list:
+        """Orders that still may change (PENDING, RECEIVED), oldest first"""
+        rows = self._query(
+            f"SELECT data FROM orders WHERE status IN ({', '.join('?' * len(OPEN))}) ORDER BY created_at",
+            *OPEN)
+        return [json.loads(row["data"]) for row in rows]
+
+    def orders_by_phone(self, phone: str) -> list:
+        rows = self._query("SELECT data FROM orders WHERE phone = ? ORDER BY created_at", phone)
+        return [json.loads(row["data"]) for row in rows]
+
+    def orders_by_product(self, product: str, status: str = None) -> list:
+        if status is None:
+            rows = self._query("SELECT data FROM orders WHERE product = ? ORDER BY created_at", str.__str__(product))
+        else:
+            rows = self._query("SELECT data FROM orders WHERE product = ? AND status = ? ORDER BY created_at", str.__str__(product), status)
+        return [json.loads(row["data"]) for row in rows]
+
+    def codes(self, phone: str) -> list:
+        """SMS codes received for phone, oldest first"""
+        rows = self._query(
+            "SELECT sms.code FROM sms JOIN orders ON orders.id = sms.order_id "
+            "WHERE orders.phone = ? AND sms.code != '' ORDER BY sms.created_at",
+            phone)
+        return [row["code"] for row in rows]
+
+    def transitions(self, id: int) -> list:
+        """[(status, unix time), ...] of order, oldest first"""
+        rows = self._query("SELECT status, at FROM transitions WHERE order_id = ? ORDER BY rowid", id)
+        return [(row["status"], row["at"]) for row in rows]
+
+    # < END Queries >
@@ -0,0 +1,234 @@
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from pysim.logger import log
+from data import Country, Operator, Product
+from type_defaultProtocol import Type_defaultProtocol
+
+
+class Provider:
+    """Protocol of :class:`Dispatcher` and its recent calls"""
+    __slots__ = ("protocol", "latencies", "results", "calls")
+
+    def __init__(self, protocol: Type_defaultProtocol, window: int = 200):
+        self.protocol = protocol
+        self.latencies = deque(maxlen=window)   # seconds of recent calls
+        self.results = deque(maxlen=window)     # True / False of recent calls
+        self.calls = 0
+
+    @property
+    def name(self) -> str:
+        return self.protocol.name or type(self.protocol).__name__
+
+    def record(self, elapsed: float, ok: bool) -> None:
+        self.latencies.append(elapsed)
+        self.results.append(ok)
+        self.calls += 1
+
+    def quantile(self, q: float) -> float:
+        """Latency quantile of recent calls, None before first call"""
+        if not self.latencies:
+            return None
+
+        latencies = sorted(self.latencies)
+        return latencies[min(int(q * len(latencies)), len(latencies) - 1)]
+
+    @property
+    def p50(self) -> float:
+        return self.quantile(0.5)
+
+    @property
+    def p99(self) -> float:
+        return self.quantile(0.99)
+
+    @property
+    def error_rate(self) -> float:
+        return self.results.count(False) / len(self.results) if self.results else 0.0
+
+    def report(self) -> dict:
+        return {"p50": self.p50, "p99": self.p99, "error_rate": self.error_rate, "calls": self.calls}
+
+
+class Dispatcher:
+    """Buys numbers from several providers..
+    Providers are tried from fastest healthy one. Purchase is hedged: if provider has not answered
+    within latency budget, next one is asked too, first bought order wins and late orders are cancelled.
+    Errors of provider (:class:`ServerOfflineError`, :class:`NoFreePhonesError`, ...) start next one at once.\n
+
+    :protocols: Protocols of :class:`Type_defaultProtocol`, in order of preference.\n
+    :hedge_after: (optional) Latency budget in seconds, by default p99 of provider clipped to :min_hedge: .. :max_hedge:.\n
+    :max_error_rate: Providers with more errors of recent calls are tried last.\n
+    :window: Count of recent calls in latency and error stats.\n
+    """
+    def __init__(self,
+        protocols: list,
+        hedge_after: float = None,
+        min_hedge: float = 0.5,
+        max_hedge: float = 5.0,
+        max_error_rate: float = 0.5,
+        window: int = 200):
+        if not protocols:
+            raise ValueError("Dispatcher needs at least one protocol")
+
+        self.providers = [Provider(protocol, window) for protocol in protocols]
+        self.hedge_after = hedge_after
+        self.min_hedge = min_hedge
+        self.max_hedge = max_hedge
+        self.max_error_rate = max_error_rate
+
+        self.executor = None # created on first buy
+
+    def rank(self) -> list:
+        """Providers in order they are tried: healthy first, faster first, unknown ones are explored first"""
+        return sorted(self.providers, key=lambda provider: (
+            provider.error_rate > self.max_error_rate,
+            provider.p50 or 0))
+
+    def budget(self, provider: Provider) -> float:
+        """Seconds to wait for :provider: before asking next one"""
+        if self.hedge_after is not None:
+            return self.hedge_after
+
+        return min(max(provider.p99 or self.max_hedge, self.min_hedge), self.max_hedge)
+
+    def report(self) -> dict:
+        """{provider name: {"p50", "p99", "error_rate", "calls"}}, same names get "#index" suffix"""
+        names = [provider.name for provider in self.providers]
+        return {
+            name if names.count(name) == 1 else f"{name}#{index}": provider.report()
+            for index, (name, provider) in enumerate(zip(names, self.providers))
+        }
+
+    def _buy(self, provider: Provider, product: Product, country: Country, operator: Operator, kwargs: dict):
+        started = time.monotonic()
+        try:
+            order = provider.protocol.buy(product, country, operator, **kwargs)
+        except Exception:
+            provider.record(time.monotonic() - started, False)
+            raise
+
+        provider.record(time.monotonic() - started, True)
+        return order
+
+    @staticmethod
+    def _cancel_late(future) -> None:
+        # order bought after winner is not needed
+        if future.cancelled() or future.exception() is not None:
+            return
+
+        order = future.result()
+        try:
+            order.cancel()
+        except Exception as error:
+            log.info(f"Cancel of late hedged order {order.id} failed: {error!r}")
+
+    def buy(self,
+        product: Product,
+        country: Country = Country.ANY,
+        operator: Operator = Operator.ANY,
+        **kwargs):
+        """Buy activation number from fastest provider..
+        Returns :class:`SimOrder` object.\n
+
+        :kwargs: (optional) Passed to buy of protocol.\n
+        """
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=len(self.providers) * 4, thread_name_prefix="Dispatcher")
+
+        ranked = self.rank()
+        pending = {}
+        error = None
+
+        while True:
+            if ranked:
+                provider = ranked.pop(0)
+                pending[self.executor.submit(self._buy, provider, product, country, operator, kwargs)] = provider
+                timeout = self.budget(provider) if ranked else None
+            elif not pending:
+                raise error
+            else:
+                timeout = None
+
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                provider = pending.pop(future)
+                if future.exception() is None:
+                    for late in pending:
+                        late.add_done_callback(self._cancel_late)
+                    return future.result()
+
+                error = future.exception()
+                log.info(f"Buy from {provider.name} failed: {error!r}")
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+
+class AsyncDispatcher(Dispatcher):
+    """Asyncio twin of :class:`Dispatcher` for async protocols"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cancels = set() # running cancels of late hedged orders, event loop keeps only weak references
+
+    async def _buy(self, provider: Provider, product: Product, country: Country, operator: Operator, kwargs: dict):
+        started = time.monotonic()
+        try:
+            order = await provider.protocol.buy(product, country, operator, **kwargs)
+        except Exception:
+            provider.record(time.monotonic() - started, False)
+            raise
+
+        provider.record(time.monotonic() - started, True)
+        return order
+
+    def _cancel_late(self, task) -> None:
+        if task.cancelled() or task.exception() is not None:
+            return
+
+        async def cancel(order):
+            try:
+                await order.cancel()
+            except Exception as error:
+                log.info(f"Cancel of late hedged order {order.id} failed: {error!r}")
+
+        cancel_task = asyncio.ensure_future(cancel(task.result()))
+        self.cancels.add(cancel_task)
+        cancel_task.add_done_callback(self.cancels.discard)
+
+    async def buy(self,
+        product: Product,
+        country: Country = Country.ANY,
+        operator: Operator = Operator.ANY,
+        **kwargs):
+        """Async :meth:`Dispatcher.buy`"""
+        ranked = self.rank()
+        pending = {}
+        error = None
+
+        try:
+            while True:
+                if ranked:
+                    provider = ranked.pop(0)
+                    pending[asyncio.ensure_future(self._buy(provider, product, country, operator, kwargs))] = provider
+                    timeout = self.budget(provider) if ranked else None
+                elif not pending:
+                    raise error
+                else:
+                    timeout = None
+
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    provider = pending.pop(task)
+                    if task.exception() is None:
+                        return task.result()
+
+                    error = task.exception()
+                    log.info(f"Buy from {provider.name} failed: {error!r}")
+        finally:
+            # orders bought after return or after caller was cancelled are canceled
+            for late in pending:
+                late.add_done_callback(self._cancel_late)
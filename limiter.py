@@ -0,0 +1,119 @@
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """Token bucket..
+    Refills :rate: tokens per second up to :capacity: (burst size).\n
+    """
+    __slots__ = ("rate", "capacity", "tokens", "updated", "_lock")
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1) -> float:
+        """Take :tokens: from bucket, returns delay in seconds before they may be used..
+        Bucket goes into debt when empty, so concurrent callers queue up fairly.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def delay(self, tokens: float = 1) -> float:
+        """Delay in seconds before :tokens: would be available, nothing is taken"""
+        with self._lock:
+            available = min(self.capacity, self.tokens + (time.monotonic() - self.updated) * self.rate)
+
+            return (tokens - available) / self.rate if available < tokens else 0.0
+
+    def drain(self) -> None:
+        """Empty bucket, used when server says the limit is already reached"""
+        with self._lock:
+            self.tokens = min(self.tokens, 0)
+            self.updated = time.monotonic()
+
+
+class RateLimiter:
+    """Client-side limiter for :class:`Session`..
+    Keeps separate token buckets per API key, per IP (whole session) and for buy endpoints,
+    and decides how long to back off after 429 / 503 responses.\n
+
+    :per_key: Requests per second for one API key, None - unlimited.\n
+    :per_ip: Requests per second for whole session, None - unlimited.\n
+    :buy: Buy requests per second, None - unlimited.\n
+    :buy_paths: Url parts of buy endpoints.\n
+    :retries: How many times to retry request after 429 / 503.\n
+    :backoff: Base delay of retry in seconds, doubled on every attempt.\n
+    :max_backoff: Max delay of one retry in seconds.\n
+    """
+    def __init__(self,
+        per_key: float = 50,
+        per_ip: float = 50,
+        buy: float = 5,
+        buy_paths: tuple = ("/user/buy/", "/user/reuse/"),
+        retries: int = 3,
+        backoff: float = 0.5,
+        max_backoff: float = 8.0):
+        self.per_key = per_key
+        self.buy_paths = buy_paths
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.keys = {} # API key -> TokenBucket
+        self.ip = TokenBucket(per_ip) if per_ip else None
+        self.buy = TokenBucket(buy) if buy else None
+        self._lock = threading.Lock()
+
+    def is_buy(self, url: str) -> bool:
+        return any(path in url for path in self.buy_paths)
+
+    def key_bucket(self, key: str) -> TokenBucket:
+        if not self.per_key or key is None:
+            return None
+
+        bucket = self.keys.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self.keys.setdefault(key, TokenBucket(self.per_key))
+
+        return bucket
+
+    def buckets(self, url: str, key: str = None) -> list:
+        buckets = [self.ip, self.key_bucket(key)]
+        if self.is_buy(url):
+            buckets.append(self.buy)
+
+        return [bucket for bucket in buckets if bucket is not None]
+
+    def acquire(self, url: str, key: str = None) -> float:
+        """Reserve request in all matching buckets, returns delay in seconds before sending it"""
+        return max([bucket.reserve() for bucket in self.buckets(url, key)], default=0.0)
+
+    def delay(self, url: str, key: str = None) -> float:
+        """Delay in seconds request would wait now, nothing is reserved"""
+        return max([bucket.delay() for bucket in self.buckets(url, key)], default=0.0)
+
+    def retry_delay(self, url: str, key: str = None, attempt: int = 0, retry_after: str = None) -> float:
+        """Delay before retry of request rejected with 429 / 503..
+        Uses server's Retry-After if given, otherwise exponential backoff with full jitter.
+        """
+        for bucket in self.buckets(url, key):
+            bucket.drain()
+
+        if retry_after:
+            try:
+                return min(float(retry_after), self.max_backoff)
+            except ValueError:
+                pass # http-date form is not used by 5sim
+
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
@@ -1,26 +1,78 @@
 import sys
 from loguru import logger
 
-# < main logger init>
-logger.remove()
+# < main logger init >
+# nothing is configured on import, application calls setup() to add pysim sinks
 
-LoggerLevel = "DEBUG"
+FORMAT = "{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}"
 
-logger.add("pysim.log",
-    rotation = "500 MB",
-    compression = "zip",
-    backtrace = True,
-    diagnose = True,
-    level=LoggerLevel,
-    format = "{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}")
+# max logged size of response body, set by setup()
+BODY_SIZE = 1024
 
-logger.add(sys.stdout,
-    backtrace = True,
-    diagnose = True,
-    level=LoggerLevel,
-    format = "{time:YYYY-MM-DD HH:mm:ss} | {level} | {message}")
+log = logger
 
+_handlers = [] # ids of sinks added by setup()
 
-log = logger
 
-# < END >
\ No newline at end of file
+def setup(
+    level: str = "INFO",
+    path: str = "pysim.log",
+    stdout: bool = True,
+    enqueue: bool = True,
+    diagnose: bool = False,
+    backtrace: bool = False,
+    body_size: int = 1024,
+    rotation: str = "500 MB",
+    compression: str = "zip",
+    replace_default: bool = True) -> None:
+    """Add pysim log sinks, replaces sinks of previous call, other loguru handlers are kept..
+    :level: Min level, "DEBUG" logs every request and is meant for debugging only.\n
+    :path: (optional) Log file, None - no file.\n
+    :stdout: Log to stdout too.\n
+    :enqueue: Write records in background thread, logging call does not wait for I/O.\n
+    :diagnose: Show variable values in tracebacks, slow and may leak api key.\n
+    :backtrace: Extend tracebacks beyond catching frame.\n
+    :body_size: Max logged bytes of response body.\n
+    :replace_default: Remove default loguru handler (DEBUG to stderr), else every request is still formatted and printed.\n
+    """
+    global BODY_SIZE
+    BODY_SIZE = body_size
+
+    for handler in _handlers:
+        logger.remove(handler)
+    _handlers.clear()
+
+    if replace_default:
+        try:
+            logger.remove(0)
+        except ValueError: # already removed
+            pass
+
+    if path:
+        _handlers.append(logger.add(path,
+            rotation = rotation,
+            compression = compression,
+            enqueue = enqueue,
+            backtrace = backtrace,
+            diagnose = diagnose,
+            level = level,
+            format = FORMAT))
+
+    if stdout:
+        _handlers.append(logger.add(sys.stdout,
+            enqueue = enqueue,
+            backtrace = backtrace,
+            diagnose = diagnose,
+            level = level,
+            format = FORMAT))
+
+
+def body(content: bytes) -> str:
+    """Response body for log message, cut to BODY_SIZE"""
+    text = content[:BODY_SIZE].decode("utf-8", errors="replace")
+    if len(content) > BODY_SIZE:
+        text += f"... (+{len(content) - BODY_SIZE} bytes)"
+
+    return text
+
+# < END >
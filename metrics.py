@@ -0,0 +1,313 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import aiohttp
+
+# upper bounds of latency buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# url part -> endpoint template, ids and names in path would make every url own endpoint
+TEMPLATES = (
+    ("/user/buy/activation/", "/user/buy/activation/{country}/{operator}/{product}"),
+    ("/user/buy/hosting/", "/user/buy/hosting/{country}/{operator}/{product}"),
+    ("/user/reuse/", "/user/reuse/{product}/{number}"),
+    ("/user/check/", "/user/check/{id}"),
+    ("/user/finish/", "/user/finish/{id}"),
+    ("/user/cancel/", "/user/cancel/{id}"),
+    ("/user/ban/", "/user/ban/{id}"),
+    ("/user/sms/inbox/", "/user/sms/inbox/{id}"),
+    ("/guest/products/", "/guest/products/{country}/{operator}"),
+    ("/guest/flash/", "/guest/flash/{lang}"),
+)
+
+_ID = re.compile(r"/\d+(?=/|$)")
+
+
+def endpoint(url: str) -> str:
+    """Template of :url: without host and query: ".../v1/user/check/123?x=1" -> "/user/check/{id}" """
+    for part, template in TEMPLATES:
+        if part in url:
+            return template
+
+    path = url.split("://", 1)[-1].partition("?")[0]
+    path = path[path.find("/"):] if "/" in path else "/"
+    if path.startswith("/v1/"):
+        path = path[3:]
+
+    return _ID.sub("/{id}", path)
+
+
+class Histogram:
+    """Latency histogram with fixed buckets, as Prometheus one"""
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: tuple = BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1) # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of bucket with :q: quantile, None if empty"""
+        if not self.count:
+            return None
+
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip(self.bounds + (float("inf"),), self.counts))
+        }
+
+
+class Endpoint:
+    """Counters of one (method, endpoint)"""
+    __slots__ = ("requests", "statuses", "errors", "retries", "bytes_in", "bytes_out", "phases")
+
+    def __init__(self):
+        self.requests = 0
+        self.statuses = {}  # status code -> count
+        self.errors = {}    # exception class name -> count
+        self.retries = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.phases = {}    # phase -> Histogram
+
+    def snapshot(self) -> dict:
+        return {
+            "requests": self.requests,
+            "statuses": dict(self.statuses),
+            "errors": dict(self.errors),
+            "retries": self.retries,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "latency": {phase: histogram.snapshot() for phase, histogram in self.phases.items()}
+        }
+
+
+class Timing:
+    """Phases of one request filled by :meth:`Metrics.trace_config` callbacks, in seconds"""
+    __slots__ = ("started", "dns", "connect", "first_byte", "bytes_out", "_mark")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.dns = None
+        self.connect = None     # includes TLS handshake
+        self.first_byte = None  # until response headers
+        self.bytes_out = 0
+        self._mark = None
+
+
+class Metrics:
+    """Per-endpoint latency and throughput of :class:`Session`..
+    Records latency histograms by phase (dns, connect, first_byte, total), responses by status,
+    mapped exceptions, bytes in / out and retries. Urls are grouped by endpoint template.
+    Read it with :meth:`snapshot` or :meth:`prometheus`, or let Prometheus pull :meth:`serve`.
+    Sync :class:`Session` knows only first_byte and total, dns and connect come from aiohttp.\n
+
+    :buckets: Upper bounds of latency buckets, in seconds.\n
+    :prefix: Prefix of exported metric names.\n
+
+    :usage:
+        metrics = Metrics()
+        protocol = Type_5simProtocol(key, metrics=metrics)
+        metrics.serve(9464)
+    """
+    def __init__(self, buckets: tuple = BUCKETS, prefix: str = "pysim"):
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+
+        self.endpoints = {} # (method, endpoint template) -> Endpoint
+        self._lock = threading.Lock()
+        self._server = None
+
+    def endpoint(self, method: str, url: str) -> Endpoint:
+        key = (str.__str__(method), endpoint(url))
+        stats = self.endpoints.get(key)
+        if stats is None:
+            with self._lock:
+                stats = self.endpoints.setdefault(key, Endpoint())
+
+        return stats
+
+    # < Recording >
+
+    def observe(self,
+        method: str,
+        url: str,
+        status: int,
+        total: float = None,
+        timing: Timing = None,
+        bytes_in: int = 0,
+        bytes_out: int = 0,
+        first_byte: float = None) -> None:
+        """Record finished request, :total: None - body was not read (stream)"""
+        stats = self.endpoint(method, url)
+        phases = {"total": total, "first_byte": first_byte}
+        if timing is not None:
+            phases.update(dns=timing.dns, connect=timing.connect, first_byte=timing.first_byte)
+            bytes_out = bytes_out or timing.bytes_out
+
+        with self._lock:
+            stats.requests += 1
+            stats.statuses[status] = stats.statuses.get(status, 0) + 1
+            stats.bytes_in += bytes_in
+            stats.bytes_out += bytes_out
+
+            for phase, value in phases.items():
+                if value is None:
+                    continue
+                histogram = stats.phases.get(phase)
+                if histogram is None:
+                    histogram = stats.phases[phase] = Histogram(self.buckets)
+                histogram.observe(value)
+
+    def retry(self, method: str, url: str) -> None:
+        stats = self.endpoint(method, url)
+        with self._lock:
+            stats.retries += 1
+
+    def error(self, method: str, url: str, error: Exception) -> None:
+        """Record exception raised for response"""
+        stats = self.endpoint(method, url)
+        name = type(error).__name__
+        with self._lock:
+            stats.errors[name] = stats.errors.get(name, 0) + 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self.endpoints = {}
+
+    # < END Recording >
+
+    # < Export >
+
+    def snapshot(self) -> dict:
+        """{"METHOD /endpoint": {"requests", "statuses", "errors", "retries", "bytes_in", "bytes_out", "latency"}}"""
+        with self._lock:
+            return {f"{method} {path}": stats.snapshot() for (method, path), stats in self.endpoints.items()}
+
+    def prometheus(self) -> str:
+        """Metrics in Prometheus text exposition format"""
+        name = self.prefix
+        lines = {
+            "duration": [f"# HELP {name}_request_duration_seconds Request latency by phase",
+                f"# TYPE {name}_request_duration_seconds histogram"],
+            "responses": [f"# HELP {name}_responses_total Responses by status code",
+                f"# TYPE {name}_responses_total counter"],
+            "errors": [f"# HELP {name}_errors_total Exceptions raised for responses",
+                f"# TYPE {name}_errors_total counter"],
+            "retries": [f"# HELP {name}_retries_total Retried requests",
+                f"# TYPE {name}_retries_total counter"],
+            "bytes_in": [f"# HELP {name}_response_bytes_total Received body bytes",
+                f"# TYPE {name}_response_bytes_total counter"],
+            "bytes_out": [f"# HELP {name}_request_bytes_total Sent body bytes",
+                f"# TYPE {name}_request_bytes_total counter"],
+        }
+
+        with self._lock:
+            for (method, path), stats in self.endpoints.items():
+                labels = f'method="{method}",endpoint="{path}"'
+
+                for phase, histogram in stats.phases.items():
+                    seen = 0
+                    for bound, count in zip(histogram.bounds + (float("inf"),), histogram.counts):
+                        seen += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines["duration"].append(f'{name}_request_duration_seconds_bucket{{{labels},phase="{phase}",le="{le}"}} {seen}')
+                    lines["duration"].append(f'{name}_request_duration_seconds_sum{{{labels},phase="{phase}"}} {histogram.sum}')
+                    lines["duration"].append(f'{name}_request_duration_seconds_count{{{labels},phase="{phase}"}} {histogram.count}')
+
+                for status, count in stats.statuses.items():
+                    lines["responses"].append(f'{name}_responses_total{{{labels},status="{status}"}} {count}')
+                for exception, count in stats.errors.items():
+                    lines["errors"].append(f'{name}_errors_total{{{labels},exception="{exception}"}} {count}')
+                lines["retries"].append(f"{name}_retries_total{{{labels}}} {stats.retries}")
+                lines["bytes_in"].append(f"{name}_response_bytes_total{{{labels}}} {stats.bytes_in}")
+                lines["bytes_out"].append(f"{name}_request_bytes_total{{{labels}}} {stats.bytes_out}")
+
+        return "\n".join(line for group in lines.values() for line in group) + "\n"
+
+    def serve(self, port: int = 9464, host: str = "127.0.0.1"):
+        """Serve :meth:`prometheus` on http://host:port/metrics in background thread, returns server"""
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                body = metrics.prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name="Metrics", daemon=True).start()
+
+        return self._server
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    # < END Export >
+
+    def trace_config(self) -> "aiohttp.TraceConfig":
+        """aiohttp trace of dns, connect (with TLS), first byte and sent bytes into :class:`Timing`
+        passed as trace_request_ctx of request"""
+        import aiohttp
+
+        async def start(session, context, params):
+            if context.trace_request_ctx is not None:
+                context.trace_request_ctx._mark = time.perf_counter()
+
+        def end(phase):
+            async def callback(session, context, params):
+                timing = context.trace_request_ctx
+                if timing is not None and timing._mark is not None:
+                    setattr(timing, phase, time.perf_counter() - timing._mark)
+            return callback
+
+        async def request_end(session, context, params):
+            timing = context.trace_request_ctx
+            if timing is not None:
+                timing.first_byte = time.perf_counter() - timing.started
+
+        async def chunk_sent(session, context, params):
+            if context.trace_request_ctx is not None:
+                context.trace_request_ctx.bytes_out += len(params.chunk)
+
+        trace = aiohttp.TraceConfig()
+        trace.on_dns_resolvehost_start.append(start)
+        trace.on_dns_resolvehost_end.append(end("dns"))
+        trace.on_connection_create_start.append(start)
+        trace.on_connection_create_end.append(end("connect"))
+        trace.on_request_chunk_sent.append(chunk_sent)
+        trace.on_request_end.append(request_end)
+
+        return trace
@@ -1,5 +1,26 @@
 from type_5simProtocol import Type_5simProtocol
+from type_5simAsyncProtocol import AsyncType_5simProtocol
+from watcher import OrderWatcher, AsyncOrderWatcher
+from pricebook import PriceBook, Offer
+from router import BuyRouter, AsyncBuyRouter
+from catalog import Catalog, AsyncCatalog
+from accounts import AccountPool, AsyncAccountPool
+from events import EventStream, AsyncEventStream, OrderEvent
 
 __all__ = [
-    'Type_5simProtocol'
+    'Type_5simProtocol',
+    'AsyncType_5simProtocol',
+    'OrderWatcher',
+    'AsyncOrderWatcher',
+    'PriceBook',
+    'Offer',
+    'BuyRouter',
+    'AsyncBuyRouter',
+    'Catalog',
+    'AsyncCatalog',
+    'AccountPool',
+    'AsyncAccountPool',
+    'EventStream',
+    'AsyncEventStream',
+    'OrderEvent'
 ]
@@ -1,15 +1,132 @@
-from data import Order
+import sys
+from datetime import datetime, timezone
+
+
+def parse_time(value: str) -> float:
+    """Parse 5sim timestamp ("2018-10-13T08:28:38.809469028Z") to unix epoch"""
+    if not value:
+        return None
+
+    date, _, fraction = value.rstrip("Z").partition(".")
+    stamp = datetime.strptime(date, "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+
+    return stamp + float("0." + fraction) if fraction else stamp
+
+
+def _intern(value):
+    # repeated short strings (status, product, country) share one object
+    return sys.intern(str.__str__(value)) if isinstance(value, str) else value
+
+
+class Sms:
+    """SMS of order, reads like dict: sms["code"], sms.get("code"), dict(sms)"""
+    __slots__ = ("id", "created_at", "date", "sender", "text", "code")
+
+    def __init__(self, sms: dict):
+        self.id = sms.get("id", sms.get("ID"))
+        self.created_at = sms.get("created_at")
+        self.date = sms.get("date")
+        self.sender = _intern(sms.get("sender"))
+        self.text = sms.get("text")
+        self.code = sms.get("code")
+
+    def keys(self) -> tuple:
+        return self.__slots__
+
+    def __getitem__(self, key: str):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key: str, default = None):
+        return getattr(self, key, default)
+
+    def __eq__(self, other):
+        return dict(self) == dict(other)
+
+    def __repr__(self):
+        return dict(self).__repr__()
+
 
 class SimOrder:
-    """Class for interaction with order"""
+    """Class for interaction with order..
+    Fields of response are kept in slots, fields unknown to it go to :extra:.
+    Refreshing methods (check, cancel, finish, ban) update order in place.
+    """
+    # fields of order response
+    FIELDS = ("id", "phone", "operator", "product", "price", "status", "expires", "sms", "created_at", "forwarding", "forwarding_number", "country")
+    # fields with few distinct values, interned
+    INTERNED = frozenset(("operator", "product", "status", "country"))
+
+    __slots__ = FIELDS + ("protocol", "extra", "_expires_ts", "_created_ts")
+
     def __init__(self, order: dict):
-        self.__dict__.update(order)
+        for name in SimOrder.__slots__: # subclasses have empty __slots__
+            object.__setattr__(self, name, None)
+        self.sms = []
+
+        self.update(order)
+
+    def update(self, order: dict):
+        """Update fields in place from order response"""
+        for name, value in order.items():
+            if name == "sms":
+                # sms list only grows, so do not rebuild it on every poll
+                if value and len(value) != len(self.sms):
+                    self.sms = [Sms(sms) for sms in value]
+            elif name in self.INTERNED:
+                setattr(self, name, _intern(value))
+            elif name == "expires":
+                if value != self.expires:
+                    self.expires, self._expires_ts = value, None
+            elif name == "created_at":
+                if value != self.created_at:
+                    self.created_at, self._created_ts = value, None
+            elif name in self.FIELDS:
+                setattr(self, name, value)
+            else:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[name] = value
+
+        return self
+
+    def __getattr__(self, name: str):
+        # only called for names missing in slots
+        extra = object.__getattribute__(self, "extra")
+        if extra is not None and name in extra:
+            return extra[name]
+
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    @property
+    def expires_ts(self) -> float:
+        """:expires: as unix epoch, parsed on first access"""
+        if self._expires_ts is None:
+            self._expires_ts = parse_time(self.expires)
+        return self._expires_ts
+
+    @property
+    def created_ts(self) -> float:
+        """:created_at: as unix epoch, parsed on first access"""
+        if self._created_ts is None:
+            self._created_ts = parse_time(self.created_at)
+        return self._created_ts
+
+    def to_dict(self) -> dict:
+        order = {name: getattr(self, name) for name in self.FIELDS}
+        order["sms"] = [dict(sms) for sms in self.sms]
+        if self.extra:
+            order.update(self.extra)
+
+        return order
 
     def __str__(self):
-        return self.__dict__.__str__()
+        return self.to_dict().__str__()
 
     def __repr__(self):
-        return self.__dict__.__repr__()
+        return self.to_dict().__repr__()
 
     def set_protocol(self, protocol):
         """:protocol: class for interaction with sms-server"""
@@ -18,25 +135,40 @@ class SimOrder:
         return self
     
     def check(self):
-        self.__dict__.update(self.protocol.check(self.id).__dict__)
-        return self
+        return self.protocol.check(self.id, into=self)
 
     def cancel(self):
-        self.__dict__.update(self.protocol.cancel(self.id).__dict__)
-        return self
+        return self.protocol.cancel(self.id, into=self)
 
     def inbox(self):
         return self.protocol.inbox(self.id)
 
     def finish(self):
-        self.__dict__.update(self.protocol.finish(self.id).__dict__)
-        return self
+        return self.protocol.finish(self.id, into=self)
     
     def ban(self):
-        self.__dict__.update(self.protocol.ban(self.id).__dict__)
-        return self
+        return self.protocol.ban(self.id, into=self)
+
+
+class AsyncSimOrder(SimOrder):
+    """Class for interaction with order through async protocol"""
+    __slots__ = ()
+
+    async def check(self):
+        return await self.protocol.check(self.id, into=self)
+
+    async def cancel(self):
+        return await self.protocol.cancel(self.id, into=self)
+
+    async def inbox(self):
+        return await self.protocol.inbox(self.id)
+
+    async def finish(self):
+        return await self.protocol.finish(self.id, into=self)
+
+    async def ban(self):
+        return await self.protocol.ban(self.id, into=self)
 
 
 if __name__ == "__main__":
     SO = SimOrder({"id":324062266,"phone":"+79852461218","operator":"mts","product":"tinder","price":1.5,"status":"PENDING","expires":"2022-06-17T21:38:48.876691Z","sms":[],"created_at":"2022-06-17T21:23:48.876691Z","country":"russia"})
-
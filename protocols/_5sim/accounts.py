@@ -0,0 +1,305 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pysim.logger import log
+from data import Country, Operator, Product, OrderId, Status
+from exceptions import UnauthorizedError, NotEnoughUserBalanceError, OrderNotFoundError
+from limiter import RateLimiter
+from _types import SimOrder
+from type_5simProtocol import Type_5simProtocol
+from type_5simAsyncProtocol import AsyncType_5simProtocol
+
+# statuses of orders which still may be checked, owners of others are forgotten
+OPEN = frozenset((Status.PENDING, Status.RECEIVED))
+
+
+class Account:
+    """One api key of :class:`AccountPool`"""
+    __slots__ = ("protocol", "balance", "checked", "inflight", "retired")
+
+    def __init__(self, protocol: Type_5simProtocol):
+        self.protocol = protocol
+        self.balance = None     # last known balance, None - not requested yet
+        self.checked = 0.0      # monotonic time of last balance request
+        self.inflight = 0       # running requests
+        self.retired = None     # reason of retirement: "unauthorized" / "balance"
+
+    @property
+    def key(self) -> str:
+        return self.protocol.session.key
+
+    def delay(self) -> float:
+        """Seconds next buy of this key would wait in its rate limiter"""
+        return self.protocol.session.limiter.delay(self.protocol.rpc + "/user/buy/", self.key)
+
+
+class AccountPool:
+    """Many 5sim accounts behind one buy / check interface..
+    Every api key has own protocol with own :class:`Session` and connection pool,
+    all of them share one :class:`RateLimiter`, so per IP limit covers the whole pool.
+    Buys go to active key with free rate limit, most balance and fewest running requests,
+    checks go to key that bought the order. Keys are retired on :class:`UnauthorizedError`
+    and while balance is below :min_balance:.\n
+
+    :keys: :class:`ApiKey` list.\n
+    :min_balance: Keys with less balance are not used until top-up.\n
+    :balance_ttl: Balance of key is requested again after this, in seconds.\n
+    :limiter: (optional) :class:`RateLimiter` shared by all keys.\n
+    :options: (optional) Passed to every protocol: rpc, cache, store, ...\n
+    """
+    protocol_class = Type_5simProtocol
+
+    def __init__(self, keys: list, min_balance: float = 1.0, balance_ttl: float = 300, limiter: RateLimiter = None, **options):
+        self.limiter = limiter or RateLimiter()
+        self.accounts = [Account(self.protocol_class(key, limiter=self.limiter, **options)) for key in keys]
+        self.min_balance = min_balance
+        self.balance_ttl = balance_ttl
+
+        self.owners = {} # order id -> Account
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.active())
+
+    def active(self) -> list:
+        return [account for account in self.accounts if account.retired is None]
+
+    # < Accounts state >
+
+    def retire(self, account: Account, reason: str) -> None:
+        if account.retired is None:
+            log.info(f"Account {account.key[-8:] if account.key else ''} retired: {reason}")
+        account.retired = reason
+
+    def update(self, account: Account, profile: dict) -> None:
+        """Store :meth:`Type_5simProtocol.balance` response of account"""
+        account.balance = profile.get("balance", 0)
+        account.checked = time.monotonic()
+
+        if account.balance < self.min_balance:
+            self.retire(account, "balance")
+        elif account.retired == "balance": # topped up
+            account.retired = None
+
+    def stale(self) -> list:
+        """Accounts which balance should be requested, retired for balance ones too"""
+        now = time.monotonic()
+        return [
+            account for account in self.accounts
+            if account.retired != "unauthorized" and now - account.checked > self.balance_ttl
+        ]
+
+    def refresh(self) -> None:
+        """Request balance of stale accounts concurrently"""
+        stale = self.stale()
+        if not stale:
+            return
+
+        def balance(account: Account):
+            try:
+                return account.protocol.balance()
+            except Exception as error:
+                return error
+
+        with ThreadPoolExecutor(max_workers=len(stale)) as executor:
+            profiles = list(executor.map(balance, stale))
+
+        self.updated(stale, profiles)
+
+    def updated(self, stale: list, profiles: list) -> None:
+        """Store balances or errors of :meth:`refresh`..
+        Account whose balance request failed keeps its last known balance and is asked again on next refresh,
+        error is raised only if it failed for every active account.
+        """
+        errors = {} # account -> error of balance request
+        for account, profile in zip(stale, profiles):
+            if isinstance(profile, UnauthorizedError):
+                self.retire(account, "unauthorized")
+            elif isinstance(profile, Exception):
+                log.info(f"Balance of account {account.key[-8:] if account.key else ''} failed: {profile!r}")
+                errors[account] = profile
+            else:
+                self.update(account, profile)
+
+        if errors and all(account in errors for account in self.active()):
+            raise next(iter(errors.values()))
+
+    def pick(self, price: float = 0) -> Account:
+        """Active account for next buy, None if there is no one"""
+        with self._lock:
+            candidates = [
+                account for account in self.active()
+                if account.balance is None or account.balance - price >= self.min_balance
+            ]
+            if not candidates:
+                return None
+
+            account = min(candidates, key=lambda account: (account.delay(), -(account.balance or 0), account.inflight))
+            account.inflight += 1
+
+        return account
+
+    def bought(self, account: Account, order: SimOrder) -> SimOrder:
+        with self._lock:
+            account.inflight -= 1
+            if account.balance is not None:
+                account.balance -= order.price or 0
+            self.owners[order.id] = account
+
+        return order
+
+    def failed(self, account: Account, error: Exception) -> None:
+        with self._lock:
+            account.inflight -= 1
+
+        if isinstance(error, UnauthorizedError):
+            self.retire(account, "unauthorized")
+        elif isinstance(error, NotEnoughUserBalanceError):
+            account.balance = 0
+            self.retire(account, "balance")
+
+    def owner(self, id: OrderId) -> Account:
+        try:
+            return self.owners[getattr(id, "id", id)]
+        except KeyError:
+            raise KeyError(f"Order {id} was not bought by this pool") from None
+
+    def settled(self, order: SimOrder) -> SimOrder:
+        """Forget owner of order in final status (finished, canceled, banned, timeout)"""
+        if order.status is not None and order.status not in OPEN:
+            with self._lock:
+                self.owners.pop(order.id, None)
+
+        return order
+
+    def forget(self, id: OrderId) -> None:
+        with self._lock:
+            self.owners.pop(getattr(id, "id", id), None)
+
+    # < END Accounts state >
+
+    # < Orders >
+
+    def buy(self,
+        product: Product,
+        country: Country = Country.ANY,
+        operator: Operator = Operator.ANY,
+        price: float = 0,
+        **kwargs) -> SimOrder:
+        """Buy activation number with best account..
+        Returns :class:`SimOrder` object bound to protocol of that account.\n
+
+        :price: (optional) Expected cost, accounts with less balance are skipped.\n
+        :kwargs: (optional) Passed to :meth:`Type_5simProtocol.buy`.\n
+        """
+        self.refresh()
+        while True:
+            account = self.pick(price)
+            if account is None:
+                raise NotEnoughUserBalanceError("No active account with enough balance")
+
+            try:
+                order = account.protocol.buy(product, country, operator, **kwargs)
+            except (UnauthorizedError, NotEnoughUserBalanceError) as error:
+                self.failed(account, error)
+                continue # next account
+            except Exception as error:
+                self.failed(account, error)
+                raise
+
+            return self.bought(account, order)
+
+    def check(self, id: OrderId) -> SimOrder:
+        """:meth:`Type_5simProtocol.check` with key that bought the order"""
+        try:
+            return self.settled(self.owner(id).protocol.check(id))
+        except OrderNotFoundError:
+            self.forget(id)
+            raise
+
+    def cancel(self, id: OrderId) -> SimOrder:
+        return self.settled(self.owner(id).protocol.cancel(id))
+
+    def finish(self, id: OrderId) -> SimOrder:
+        return self.settled(self.owner(id).protocol.finish(id))
+
+    def ban(self, id: OrderId) -> SimOrder:
+        return self.settled(self.owner(id).protocol.ban(id))
+
+    # < END Orders >
+
+    def report(self) -> list:
+        """[{"key", "balance", "retired", "inflight", "delay"}, ...] of all accounts"""
+        return [
+            {
+                "key": account.key[-8:] if account.key else None,
+                "balance": account.balance,
+                "retired": account.retired,
+                "inflight": account.inflight,
+                "delay": account.delay()
+            }
+            for account in self.accounts
+        ]
+
+
+class AsyncAccountPool(AccountPool):
+    """Asyncio twin of :class:`AccountPool` with :class:`AsyncType_5simProtocol` per key"""
+    protocol_class = AsyncType_5simProtocol
+
+    async def refresh(self) -> None:
+        """Async :meth:`AccountPool.refresh`, balances are requested concurrently"""
+        stale = self.stale()
+        profiles = await asyncio.gather(*(account.protocol.balance() for account in stale), return_exceptions=True)
+        self.updated(stale, profiles)
+
+    async def buy(self,
+        product: Product,
+        country: Country = Country.ANY,
+        operator: Operator = Operator.ANY,
+        price: float = 0,
+        **kwargs) -> SimOrder:
+        """Async :meth:`AccountPool.buy`"""
+        await self.refresh()
+        while True:
+            account = self.pick(price)
+            if account is None:
+                raise NotEnoughUserBalanceError("No active account with enough balance")
+
+            try:
+                order = await account.protocol.buy(product, country, operator, **kwargs)
+            except (UnauthorizedError, NotEnoughUserBalanceError) as error:
+                self.failed(account, error)
+                continue
+            except Exception as error:
+                self.failed(account, error)
+                raise
+
+            return self.bought(account, order)
+
+    async def check(self, id: OrderId) -> SimOrder:
+        try:
+            return self.settled(await self.owner(id).protocol.check(id))
+        except OrderNotFoundError:
+            self.forget(id)
+            raise
+
+    async def cancel(self, id: OrderId) -> SimOrder:
+        return self.settled(await self.owner(id).protocol.cancel(id))
+
+    async def finish(self, id: OrderId) -> SimOrder:
+        return self.settled(await self.owner(id).protocol.finish(id))
+
+    async def ban(self, id: OrderId) -> SimOrder:
+        return self.settled(await self.owner(id).protocol.ban(id))
+
+    async def close(self) -> None:
+        for account in self.accounts:
+            await account.protocol.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
@@ -0,0 +1,155 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+
+from pysim.logger import log
+from data import OrderId
+from exceptions import (
+    NotEnoughUserBalanceError, UnauthorizedError, OrderNotFoundError, 
+    OrderExpiredError, OrderNoSMSError, HostingOrderError
+)
+from _types import SimOrder
+
+# errors after which no more attempts are made
+STOP = (NotEnoughUserBalanceError, UnauthorizedError)
+
+# errors of one order, reported in its outcome instead of raised
+PER_ORDER = (OrderNotFoundError, OrderExpiredError, OrderNoSMSError, HostingOrderError)
+
+
+@dataclass
+class BatchFailure:
+    attempt: int
+    error: Exception
+
+
+@dataclass
+class BatchResult:
+    orders: list = field(default_factory=list)      # successful SimOrder
+    failures: list = field(default_factory=list)    # BatchFailure
+    stopped: Exception = None                       # error from STOP that ended batch early
+
+    @property
+    def ok(self) -> bool:
+        return not self.failures
+
+
+@dataclass
+class OrderOutcome:
+    id: OrderId
+    order: SimOrder = None
+    error: Exception = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class BatchError(Exception):
+    """Error outside PER_ORDER in :func:`each`, raised after all orders are done..
+    :outcomes: :class:`OrderOutcome` of every order, unexpected errors included.
+    """
+    def __init__(self, outcomes: list):
+        self.outcomes = outcomes
+        self.errors = [outcome.error for outcome in outcomes if outcome.error is not None and not isinstance(outcome.error, PER_ORDER)]
+        super().__init__(f"{len(self.errors)} of {len(outcomes)} orders failed: {self.errors[0]!r}")
+
+
+def repeat(call, n: int, concurrency: int = 10, max_failures: int = None) -> BatchResult:
+    """Call :call: in threads until it succeeds :n: times..
+    At most :concurrency: calls run at once and never more than needed for :n: successes.
+    Stops after :max_failures: failures (default :n:) or on error from STOP.
+    """
+    max_failures = n if max_failures is None else max_failures
+    result = BatchResult()
+    attempts = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        pending = {}
+        while True:
+            while (result.stopped is None
+                and len(result.orders) + len(pending) < n
+                and len(pending) < concurrency
+                and len(result.failures) < max_failures):
+                pending[executor.submit(call)] = attempts
+                attempts += 1
+
+            if not pending:
+                return result
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                _collect(result, pending.pop(future), future)
+
+
+async def arepeat(call, n: int, concurrency: int = 10, max_failures: int = None) -> BatchResult:
+    """Async :func:`repeat`, :call: returns coroutine"""
+    max_failures = n if max_failures is None else max_failures
+    result = BatchResult()
+    attempts = 0
+
+    pending = {}
+    while True:
+        while (result.stopped is None
+            and len(result.orders) + len(pending) < n
+            and len(pending) < concurrency
+            and len(result.failures) < max_failures):
+            pending[asyncio.ensure_future(call())] = attempts
+            attempts += 1
+
+        if not pending:
+            return result
+
+        done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for future in done:
+            _collect(result, pending.pop(future), future)
+
+
+def each(call, ids, concurrency: int = 10) -> list:
+    """Call :call: for every order id in threads, returns :class:`OrderOutcome` list in order of :ids:..
+    At most :concurrency: calls run at once. Errors from PER_ORDER go to outcomes, others are raised
+    as :class:`BatchError` with outcomes of all orders after every call is done.
+    :ids: :class:`OrderId` or :class:`SimOrder` items.
+    """
+    def outcome(id: OrderId) -> OrderOutcome:
+        try:
+            return OrderOutcome(id, call(id))
+        except Exception as error:
+            return OrderOutcome(id, error=error)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return _checked(list(executor.map(outcome, [getattr(id, "id", id) for id in ids])))
+
+
+async def aeach(call, ids, concurrency: int = 10) -> list:
+    """Async :func:`each`, :call: returns coroutine"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def outcome(id: OrderId) -> OrderOutcome:
+        async with semaphore:
+            try:
+                return OrderOutcome(id, await call(id))
+            except Exception as error:
+                return OrderOutcome(id, error=error)
+
+    return _checked(list(await asyncio.gather(*(outcome(getattr(id, "id", id)) for id in ids))))
+
+
+def _checked(outcomes: list) -> list:
+    # outcomes of other orders must not be lost with unexpected error of one
+    if any(outcome.error is not None and not isinstance(outcome.error, PER_ORDER) for outcome in outcomes):
+        raise BatchError(outcomes)
+
+    return outcomes
+
+
+def _collect(result: BatchResult, attempt: int, future) -> None:
+    error = future.exception()
+    if error is None:
+        result.orders.append(future.result())
+        return
+
+    log.info(f"Batch attempt {attempt} failed: {error!r}")
+    result.failures.append(BatchFailure(attempt, error))
+    if isinstance(error, STOP):
+        result.stopped = error
@@ -0,0 +1,208 @@
+"""Offline benchmarks of 5sim protocols against local :class:`MockServer`..
+Measures requests/sec and p50 / p99 latency of main flows, memory per open order and import time.
+
+    python bench.py                                  # print results
+    python bench.py --save baseline.json             # keep results
+    python bench.py --compare baseline.json          # exit 1 on regression
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from pysim.logger import log
+from mock_server import MockServer
+from limiter import RateLimiter
+from data import Product
+from type_5simProtocol import Type_5simProtocol
+from type_5simAsyncProtocol import AsyncType_5simProtocol
+
+# result fields where more is better, others are better when less
+HIGHER = ("rps",)
+
+
+def quantile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def stats(latencies: list, elapsed: float) -> dict:
+    """{"rps", "p50", "p99"} of calls, latencies in milliseconds"""
+    return {
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50": round(quantile(latencies, 0.5) * 1000, 3),
+        "p99": round(quantile(latencies, 0.99) * 1000, 3)
+    }
+
+
+def unlimited() -> RateLimiter:
+    # mock server has no limits, measure client only
+    return RateLimiter(per_key=None, per_ip=None, buy=None, retries=0)
+
+
+def timed(call, latencies: list):
+    started = time.perf_counter()
+    result = call()
+    latencies.append(time.perf_counter() - started)
+
+    return result
+
+
+# < Flows >
+
+def bench_orders(server: MockServer, n: int, concurrency: int) -> dict:
+    """buy -> check -> finish of :n: orders in :concurrency: threads"""
+    protocol = Type_5simProtocol(key="bench", rpc=server.url, limiter=unlimited(), pool_maxsize=concurrency)
+    latencies = []
+
+    def flow(_):
+        order = timed(lambda: protocol.buy(Product.TINDER), latencies)
+        timed(lambda: protocol.check(order.id, into=order), latencies)
+        timed(lambda: protocol.finish(order.id, into=order), latencies)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        list(executor.map(flow, range(n)))
+
+    return stats(latencies, time.perf_counter() - started)
+
+
+def bench_async_orders(server: MockServer, n: int, concurrency: int) -> dict:
+    """Async buy -> check -> finish of :n: orders, :concurrency: at once"""
+    latencies = []
+
+    async def timed_async(call):
+        started = time.perf_counter()
+        result = await call
+        latencies.append(time.perf_counter() - started)
+        return result
+
+    async def main():
+        async with AsyncType_5simProtocol(key="bench", rpc=server.url, limit=concurrency, limiter=unlimited()) as protocol:
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def flow():
+                async with semaphore:
+                    order = await timed_async(protocol.buy(Product.TINDER))
+                    await timed_async(protocol.check(order.id, into=order))
+                    await timed_async(protocol.finish(order.id, into=order))
+
+            started = time.perf_counter()
+            await asyncio.gather(*(flow() for _ in range(n)))
+            return time.perf_counter() - started
+
+    return stats(latencies, asyncio.run(main()))
+
+
+def bench_prices(server: MockServer, n: int) -> dict:
+    """Full prices catalog, parsed whole and streamed by rows"""
+    protocol = Type_5simProtocol(key="bench", rpc=server.url, limiter=unlimited())
+    result = {}
+
+    for name, call in (
+        ("prices", lambda: protocol.prices()),
+        ("iter_prices", lambda: sum(1 for _ in protocol.iter_prices()))):
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(n):
+            timed(call, latencies)
+        result[name] = stats(latencies, time.perf_counter() - started)
+
+    return result
+
+
+def bench_memory(server: MockServer, n: int) -> dict:
+    """Bytes kept by one open :class:`SimOrder` with its sms"""
+    protocol = Type_5simProtocol(key="bench", rpc=server.url, limiter=unlimited())
+    ids = [protocol.buy(Product.TINDER).id for _ in range(n)]
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    orders = [protocol.check(id) for id in ids]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return {"bytes_per_order": round((after - before) / len(orders))}
+
+
+def bench_import(module: str = "type_5simProtocol", runs: int = 5) -> dict:
+    """Best of :runs: import times of :module: in fresh interpreter, in milliseconds"""
+    code = f"import time; started = time.perf_counter(); import {module}; print(time.perf_counter() - started)"
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(sys.path)}
+    times = [
+        float(subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True).stdout)
+        for _ in range(runs)]
+
+    return {"import_ms": round(min(times) * 1000, 1)}
+
+# < END Flows >
+
+
+def run(n: int = 500, concurrency: int = 16, latency: float = 0) -> dict:
+    """{flow: {metric: value}} of all benchmarks"""
+    results = {}
+    with MockServer(latency=latency, balance=float("inf")) as server:
+        results["orders"] = bench_orders(server, n, concurrency)
+        results["async_orders"] = bench_async_orders(server, n, concurrency)
+        results.update(bench_prices(server, max(n // 100, 3)))
+        results["memory"] = bench_memory(server, n)
+    results["import"] = bench_import()
+
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions of :results: against :baseline: beyond :tolerance: share"""
+    regressions = []
+    for flow, metrics in baseline.items():
+        for metric, old in metrics.items():
+            new = results.get(flow, {}).get(metric)
+            if new is None or not old:
+                continue
+
+            change = (new - old) / old
+            if (change < -tolerance) if metric in HIGHER else (change > tolerance):
+                regressions.append(f"{flow}.{metric}: {old} -> {new} ({change:+.0%})")
+
+    return regressions
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline benchmarks of 5sim protocols")
+    parser.add_argument("-n", type=int, default=500, help="orders per flow")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0, help="server latency, seconds")
+    parser.add_argument("--save", help="write results to json file")
+    parser.add_argument("--compare", help="baseline json file, exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed share of regression")
+    args = parser.parse_args(argv)
+
+    log.remove() # debug records of every request would be measured too
+    results = run(args.n, args.concurrency, args.latency)
+    for flow, metrics in results.items():
+        print(f"{flow:<14}" + "  ".join(f"{metric} {value}" for metric, value in metrics.items()))
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression)
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,208 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+
+from pysim.logger import log
+from data import Country, Product, Operator, Table
+
+# keys of countries() items that are not operators
+META = frozenset(("iso", "prefix", "text_en", "text_ru"))
+
+
+def member_name(value: str) -> str:
+    """Name of new :class:`Table` member for wire value: "1688" -> "_1688", "a-b" -> "A_B" """
+    name = re.sub(r"\W", "_", value.upper())
+    return "_" + name if name[:1].isdigit() else name
+
+
+def register(table: Table, values) -> None:
+    """Add unknown :values: to :table:, so they are usable as Country.X / Product.X"""
+    for value in values:
+        if value not in table:
+            table.add(member_name(value), value)
+
+
+class Catalog:
+    """Live countries, their operators and products of 5sim..
+    Built from :meth:`Type_5simProtocol.countries` and :meth:`Type_5simProtocol.products`,
+    saved to local snapshot for fast warm start and refreshed in background thread.
+    New names are added to :class:`Country`, :class:`Product` and :class:`Operator`.
+    Empty catalog (not loaded yet) knows nothing and allows everything.\n
+
+    :protocol: :class:`Type_5simProtocol` used for refresh.\n
+    :path: (optional) Snapshot file, None - no snapshot.\n
+    :interval: Refresh period, in seconds.\n
+    """
+    def __init__(self, protocol, path: str = "pysim_catalog.json", interval: float = 3600):
+        self.protocol = protocol
+        self.path = path
+        self.interval = interval
+
+        self.countries = {}  # country -> frozenset of its operators
+        self.products = {}   # product -> category
+        self.updated = 0     # unix time of catalog data
+
+        self._stop = threading.Event()
+        self._runner = None
+
+    def __bool__(self):
+        return bool(self.countries or self.products)
+
+    # < Lookup >
+
+    def has_country(self, country: Country) -> bool:
+        return not self.countries or country in self.countries
+
+    def has_product(self, product: Product) -> bool:
+        return not self.products or product in self.products
+
+    def has_operator(self, country: Country, operator: Operator) -> bool:
+        """Is :operator: sold in :country:, "any" is sold everywhere country is"""
+        if not self.countries:
+            return True
+
+        operators = self.countries.get(country)
+        return operators is not None and (operator == Operator.ANY or operator in operators)
+
+    def forget(self, country: Country, operator: Operator = None) -> None:
+        """Drop rejected by server country or its operator until next refresh"""
+        if operator is None or operator == Operator.ANY:
+            self.countries = {key: value for key, value in self.countries.items() if key != country}
+        elif country in self.countries:
+            self.countries = {**self.countries, country: self.countries[country] - {operator}}
+
+    # < END Lookup >
+
+    # < Load and refresh >
+
+    def apply(self, data: dict) -> "Catalog":
+        """Replace catalog by snapshot dict {"updated", "countries": {country: [operators]}, "products": {product: category}}"""
+        countries = {country: frozenset(operators) for country, operators in data.get("countries", {}).items()}
+        products = dict(data.get("products", {}))
+
+        register(Country, countries)
+        register(Product, products)
+        register(Operator, {operator for operators in countries.values() for operator in operators})
+
+        # readers see either old or new catalog, never half of it
+        self.countries, self.products = countries, products
+        self.updated = data.get("updated", time.time())
+
+        return self
+
+    def snapshot(self) -> dict:
+        return {
+            "updated": self.updated,
+            "countries": {country: sorted(operators) for country, operators in self.countries.items()},
+            "products": self.products
+        }
+
+    def load(self) -> bool:
+        """Load snapshot file, returns False if there is no valid one"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                self.apply(json.load(file))
+        except (OSError, ValueError) as error:
+            log.info(f"Catalog snapshot {self.path} is not loaded: {error!r}")
+            return False
+
+        return True
+
+    def save(self) -> None:
+        if not self.path:
+            return
+
+        temp = self.path + ".tmp"
+        with open(temp, "w", encoding="utf-8") as file:
+            json.dump(self.snapshot(), file)
+        os.replace(temp, self.path) # readers never see half written file
+
+    @staticmethod
+    def parse(countries: dict, products: dict) -> dict:
+        """Snapshot dict from responses of countries() and products(any, any)"""
+        return {
+            "updated": time.time(),
+            "countries": {
+                country: [key for key in info if key not in META]
+                for country, info in countries.items()
+            },
+            "products": {product: info.get("Category") for product, info in products.items()}
+        }
+
+    def refresh(self) -> "Catalog":
+        self.apply(self.parse(
+            self.protocol.countries(),
+            self.protocol.products(Country.ANY, Operator.ANY)))
+        self.save()
+
+        return self
+
+    def age(self) -> float:
+        return time.time() - self.updated
+
+    def start(self) -> "Catalog":
+        """Load snapshot and refresh in background thread every :interval:"""
+        self.load()
+        self._stop.clear()
+        self._runner = threading.Thread(target=self._refresh_loop, name="Catalog", daemon=True)
+        self._runner.start()
+
+        return self
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._runner is not None:
+            self._runner.join()
+            self._runner = None
+
+    def _refresh_loop(self) -> None:
+        delay = max(self.interval - self.age(), 0)
+        while not self._stop.wait(delay):
+            try:
+                self.refresh()
+                delay = self.interval
+            except Exception as error: # keep old catalog, try again sooner
+                log.info(f"Catalog refresh failed: {error!r}")
+                delay = min(self.interval, 60)
+
+    # < END Load and refresh >
+
+
+class AsyncCatalog(Catalog):
+    """Asyncio twin of :class:`Catalog` for :class:`AsyncType_5simProtocol`, refreshes in task of running loop"""
+    async def refresh(self) -> "AsyncCatalog":
+        countries, products = await asyncio.gather(
+            self.protocol.countries(),
+            self.protocol.products(Country.ANY, Operator.ANY))
+        self.apply(self.parse(countries, products))
+        self.save()
+
+        return self
+
+    def start(self) -> "AsyncCatalog":
+        self.load()
+        self._runner = asyncio.ensure_future(self._refresh_loop())
+
+        return self
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            self._runner.cancel()
+            self._runner = None
+
+    async def _refresh_loop(self) -> None:
+        delay = max(self.interval - self.age(), 0)
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.refresh()
+                delay = self.interval
+            except Exception as error:
+                log.info(f"Catalog refresh failed: {error!r}")
+                delay = min(self.interval, 60)
@@ -1,11 +1,95 @@
 
-from asyncio.base_futures import _FINISHED
 from dataclasses import dataclass
-import enum
-import requests
-import logging
+import json
 
-class Errors(str, enum.Enum):
+# fastest installed json parser, all of them accept bytes
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    try:
+        from ujson import loads as json_loads
+    except ImportError:
+        json_loads = json.loads
+
+class Table(type):
+    """Metaclass of compact string catalogs..
+    str attributes of class body become members: instances of the class equal to their wire value,
+    so they format, hash and compare like plain str ("russia" == Country.RUSSIA, f"{Country.RUSSIA}" == "russia").
+    Members with same value are aliases of first one, lookup by value is O(1): Country("russia").
+    """
+    def __new__(mcs, name: str, bases: tuple, namespace: dict):
+        values = {key: value for key, value in namespace.items() if not key.startswith("__") and type(value) is str}
+        cls = super().__new__(mcs, name, bases, {key: value for key, value in namespace.items() if key not in values})
+        cls._members = {}   # name -> member
+        cls._values = {}    # value -> member
+
+        for key, value in values.items():
+            cls.add(key, value)
+
+        return cls
+
+    def add(cls, name: str, value: str):
+        """Add member, returns existing one if :value: is known already"""
+        member = cls._values.get(value)
+        if member is None:
+            member = str.__new__(cls, value)
+            member.name = name
+            cls._values[str.__str__(member)] = member
+
+        cls._members.setdefault(name, member)
+        return member
+
+    def __getattr__(cls, name: str):
+        # member becomes class attribute on first access, setting hundreds of them on import is slow
+        try:
+            member = cls.__dict__["_members"][name]
+        except KeyError:
+            raise AttributeError(f"type object {cls.__name__!r} has no attribute {name!r}") from None
+
+        type.__setattr__(cls, name, member)
+        return member
+
+    def __dir__(cls):
+        return [*super().__dir__(), *cls._members]
+
+    def __call__(cls, value: str):
+        try:
+            return cls._values[value]
+        except KeyError:
+            raise ValueError(f"{value!r} is not a valid {cls.__name__}") from None
+
+    def get(cls, value: str, default = None):
+        return cls._values.get(value, default)
+
+    def __getitem__(cls, name: str):
+        return cls._members[name]
+
+    def __iter__(cls):
+        return iter(cls._values.values())
+
+    def __len__(cls):
+        return len(cls._values)
+
+    def __contains__(cls, value) -> bool:
+        return value in cls._values
+
+
+class Member(str, metaclass=Table):
+    """Member of :class:`Table` catalog, str of its wire value"""
+    name = None
+
+    @property
+    def value(self) -> str:
+        return str.__str__(self)
+
+    def __repr__(self):
+        return f"<{type(self).__name__}.{self.name}: {str.__str__(self)!r}>"
+
+    def __reduce__(self):
+        return type(self), (str.__str__(self),)
+
+
+class Errors(Member):
     # errors list
     NO_FREE_PHONES = "no free phones"
     REUSE_NOT_POSSIBLE = "reuse not possible"
@@ -30,7 +114,7 @@ class Errors(str, enum.Enum):
     RECORD_NOT_FOUND = "<html><head><title>not found</title></head><body>not found</body></html>"
 
 
-class Category(str, enum.Enum):
+class Category(Member):
     ACTIVATION = "activation"
     HOSTING = "hosting"
 
@@ -52,7 +136,7 @@ class ApiKey(str):
 class URL(str):
     pass
 
-class ReqType(str, enum.Enum):
+class ReqType(Member):
     GET = "GET"
     POST = "POST"
     HEAD = "HEAD"
@@ -64,16 +148,46 @@ class Number(int):
 class OrderId(int):
     pass
 
-class Lang(str, enum.Enum):
+class Lang(Member):
     RU = "ru"
     EN = "en"
 
-@dataclass
 class ReqResponse:
-    req: requests.Response
-    json: dict
-    text: str
-    content: str # as binary
+    """Response of sms-server..
+    Only raw body is kept, :text: and :json: are decoded on first access.\n
+
+    :status_code: HTTP status.\n
+    :headers: Response headers.\n
+    :content: Body as bytes.\n
+    :encoding: (optional) Charset of body, utf-8 by default.\n
+    """
+    __slots__ = ("status_code", "headers", "content", "encoding", "_text", "_json")
+
+    def __init__(self, status_code: int, headers: dict, content: bytes, encoding: str = None):
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding or "utf-8"
+        self._text = None
+        self._json = None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self.content.decode(self.encoding, errors="replace")
+        return self._text
+
+    @property
+    def json(self) -> dict:
+        if self._json is None:
+            # parse bytes directly, no intermediate str for utf-8 bodies
+            utf8 = self.encoding.lower().replace("_", "-") in ("utf-8", "utf8", "ascii")
+            self._json = json_loads(self.content if utf8 else self.text)
+        return self._json
+
+    def copy(self) -> "ReqResponse":
+        """Response with same body and own :text: / :json:, safe to change by caller"""
+        return ReqResponse(self.status_code, self.headers.copy(), self.content, self.encoding)
 
 
 @dataclass
@@ -81,7 +195,7 @@ class User:
     service         = Service
     key             = ApiKey
     isdb_logging    = bool
-    log_level       = logging.INFO
+    log_level       = 20 # logging.INFO
 
 @dataclass
 class Status:
@@ -92,8 +206,7 @@ class Status:
     FINISHED = "FINISHED"
     BANNED = "BANNED"
 
-@dataclass
-class Country(str, enum.Enum):
+class Country(Member):
     ANY = "any"
     AFGHANISTAN = "afghanistan"
     ALBANIA = "albania"
@@ -270,7 +383,7 @@ class Country(str, enum.Enum):
     ZAMBIA = "zambia"
     ZIMBABWE = "zimbabwe"
 
-class Product(str, enum.Enum):
+class Product(Member):
     _1688 = "1688"
     _23RED = "23red"
     _32RED = "32red"
@@ -582,7 +695,7 @@ class Product(str, enum.Enum):
     ZOMATO = "zomato"
 
 
-class Operator(str, enum.Enum):
+class Operator(Member):
     ANY = "any"                     # any (any operator)
     _019 = "019"                    # 019
     ACTIV = "activ"                 # activ (virt10)
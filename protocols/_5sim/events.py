@@ -0,0 +1,214 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+
+from pysim.logger import log
+from data import Category, Status
+from exceptions import OrderNotFoundError
+from _types import SimOrder, parse_time
+
+# statuses of orders which still may get sms or change status
+OPEN = frozenset((Status.PENDING, Status.RECEIVED))
+
+
+@dataclass
+class OrderEvent:
+    kind: str                                   # "sms" - new sms came, "status" - status changed
+    order: SimOrder                             # order updated in place
+    sms: list = field(default_factory=list)     # new Sms of "sms" event
+    previous: str = None                        # status before "status" event
+
+
+class EventStream:
+    """Sms and status events of many open orders..
+    Every poll walks newest pages of :meth:`Type_5simProtocol.orders` history (one request covers
+    :page_size: orders) and diffs them with known state instead of check() per order.
+    Tracked orders missing in walked pages are checked one by one.
+    Orders are updated in place and dropped after final status.\n
+
+    :protocol: :class:`Type_5simProtocol`.\n
+    :orders: (optional) :class:`SimOrder` to follow, None - all open orders of account, new ones too.\n
+    :interval: Seconds between polls.\n
+    :category: :class:`Category` of history.\n
+    :page_size: Orders in one history request.\n
+    :horizon: Without :orders: history is walked back to orders older than this, in seconds.\n
+    """
+    def __init__(self,
+        protocol,
+        orders: list = None,
+        interval: float = 2.0,
+        category: Category = Category.ACTIVATION,
+        page_size: int = 100,
+        horizon: float = 1800):
+        self.protocol = protocol
+        self.interval = interval
+        self.category = category
+        self.page_size = page_size
+        self.horizon = horizon
+
+        self.discover = orders is None
+        self.orders = {}    # order id -> SimOrder
+        for order in orders or ():
+            self.track(order)
+
+    def __len__(self):
+        return len(self.orders)
+
+    def track(self, order: SimOrder) -> None:
+        if order.status is None or order.status in OPEN:
+            self.orders[order.id] = order
+
+    def untrack(self, id) -> None:
+        self.orders.pop(id, None)
+
+    def done(self) -> bool:
+        """No more events are possible"""
+        return not self.discover and not self.orders
+
+    def more(self, page: dict, offset: int, oldest: int) -> bool:
+        """Is next history page needed after :offset: items"""
+        data = page.get("Data") or []
+        if not data or offset >= page.get("Total", 0):
+            return False
+
+        last = data[-1]
+        if oldest is not None and last["id"] > oldest: # tracked order is further
+            return True
+
+        return self.discover and (parse_time(last.get("created_at")) or 0) > time.time() - self.horizon
+
+    def diff(self, item: dict) -> list:
+        """Update known order from history :item:, returns its events"""
+        order = self.orders.get(item["id"])
+        if order is None:
+            if not self.discover or item.get("status") not in OPEN:
+                return []
+            # first sight: status is not a change, sms already there are
+            order = self.orders[item["id"]] = self.protocol._order(item)
+            return self.changes(order, order.status, 0)
+
+        status, sms = order.status, len(order.sms)
+        self.protocol._order(item, into=order)
+
+        return self.changes(order, status, sms)
+
+    def changes(self, order: SimOrder, status: str, sms: int) -> list:
+        events = []
+        if len(order.sms) > sms:
+            events.append(OrderEvent("sms", order, sms=order.sms[sms:]))
+        if order.status != status:
+            events.append(OrderEvent("status", order, previous=status))
+
+        if order.status not in OPEN:
+            self.untrack(order.id)
+
+        return events
+
+    def poll(self) -> list:
+        """Poll once, returns list of :class:`OrderEvent`"""
+        oldest = min(self.orders, default=None)
+        seen = set()
+        events = []
+
+        offset = 0
+        while True:
+            page = self.protocol.orders(self.category, self.page_size, offset, "id", True)
+            for item in page.get("Data") or []:
+                seen.add(item["id"])
+                events += self.diff(item)
+
+            offset += len(page.get("Data") or [])
+            if not self.more(page, offset, oldest):
+                break
+
+        for order in [order for id, order in self.orders.items() if id not in seen]:
+            status, sms = order.status, len(order.sms)
+            try:
+                self.protocol.check(order.id, into=order)
+            except OrderNotFoundError:
+                self.untrack(order.id)
+                continue
+            except Exception as error:
+                log.info(f"Order {order.id} check failed: {error!r}")
+                continue
+
+            events += self.changes(order, status, sms)
+
+        return events
+
+    def updates(self, timeout: float = None):
+        """Yields :class:`OrderEvent` until orders are done or :timeout: passed"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            started = time.monotonic()
+            yield from self.poll()
+
+            if self.done():
+                return
+
+            delay = self.interval - (time.monotonic() - started)
+            if deadline is not None:
+                if deadline <= time.monotonic() + max(delay, 0):
+                    return
+            if delay > 0:
+                time.sleep(delay)
+
+    def __iter__(self):
+        return self.updates()
+
+
+class AsyncEventStream(EventStream):
+    """Asyncio twin of :class:`EventStream` for :class:`AsyncType_5simProtocol`, use with `async for`"""
+    async def poll(self) -> list:
+        """Async :meth:`EventStream.poll`, missing orders are checked concurrently"""
+        oldest = min(self.orders, default=None)
+        seen = set()
+        events = []
+
+        offset = 0
+        while True:
+            page = await self.protocol.orders(self.category, self.page_size, offset, "id", True)
+            for item in page.get("Data") or []:
+                seen.add(item["id"])
+                events += self.diff(item)
+
+            offset += len(page.get("Data") or [])
+            if not self.more(page, offset, oldest):
+                break
+
+        missing = [order for id, order in self.orders.items() if id not in seen]
+        before = [(order.status, len(order.sms)) for order in missing]
+        results = await asyncio.gather(
+            *(self.protocol.check(order.id, into=order) for order in missing),
+            return_exceptions=True)
+
+        for order, (status, sms), result in zip(missing, before, results):
+            if isinstance(result, OrderNotFoundError):
+                self.untrack(order.id)
+            elif isinstance(result, Exception):
+                log.info(f"Order {order.id} check failed: {result!r}")
+            else:
+                events += self.changes(order, status, sms)
+
+        return events
+
+    async def updates(self, timeout: float = None):
+        """Async :meth:`EventStream.updates`"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            started = time.monotonic()
+            for event in await self.poll():
+                yield event
+
+            if self.done():
+                return
+
+            delay = self.interval - (time.monotonic() - started)
+            if deadline is not None:
+                if deadline <= time.monotonic() + max(delay, 0):
+                    return
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    def __aiter__(self):
+        return self.updates()
@@ -107,6 +107,12 @@ class OrderExpiredError(Exception):
     400 [order expired] https://docs.5sim.net/#ban-order"""
     pass
 
+class OrderHasSMSError(Exception):
+    """
+    400 [order has sms] https://docs.5sim.net/#cancel-order\n
+    400 [order has sms] https://docs.5sim.net/#ban-order"""
+    pass
+
 class OrderNoSMSError(Exception):
     """
     400 [order no sms] https://docs.5sim.net/#finish-order\n
@@ -140,3 +146,7 @@ class RequestLimitBuyNumberError(Exception):
 class RequestLimitBanError(Exception):
     """https://docs.5sim.net/#structure-of-sms"""
     pass
+
+class HTTPStatusError(Exception):
+    """5xx or other unexpected status without own exception"""
+    pass
@@ -0,0 +1,323 @@
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+from data import Errors
+
+# order lives 15 minutes on 5sim
+ORDER_TTL = 900
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024 # benchmarks open many connections at once
+
+
+def timestamp(seconds: float) -> str:
+    """5sim timestamp of unix epoch: "2018-10-13T08:28:38.809469Z" """
+    return datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+class MockServer:
+    """Local stand-in of 5sim api for offline tests and benchmarks..
+    Serves endpoints of :class:`Type_5simProtocol` with generated catalog of realistic size,
+    keeps bought orders in memory and delivers sms :sms_after: seconds after buy.\n
+
+    :latency: Seconds added to every response, (min, max) - random in range.\n
+    :errors: (optional) [(path prefix, probability, status, body), ...] injected errors,
+        ("/user/buy", 0.1, 200, Errors.NO_FREE_PHONES) - every 10th buy has no free phones.\n
+    :countries: :products: :operators: Size of generated catalog.\n
+    :balance: Balance of account, buys are rejected when it is spent.\n
+    :sms_after: Seconds from buy to sms, None - sms never comes.\n
+    :seed: Seed of catalog and injected errors, same seed - same responses.\n
+
+    :usage:
+        with MockServer(latency=0.01) as server:
+            protocol = Type_5simProtocol(key="test", rpc=server.url)
+    """
+    def __init__(self,
+        latency: float = 0,
+        errors: list = None,
+        countries: int = 50,
+        products: int = 200,
+        operators: int = 5,
+        balance: float = 1000.0,
+        sms_after: float = 0,
+        seed: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0):
+        self.latency = latency
+        self.errors = errors or []
+        self.balance = balance
+        self.sms_after = sms_after
+
+        self.random = random.Random(seed)
+        self.catalog = self.generate(countries, products, operators)
+        self.orders = {}        # id -> order dict
+        self.requests = 0       # served requests
+        self.next_id = 100000000
+        self._lock = threading.Lock()
+        self._cache = {}        # prices query -> encoded body
+
+        self.server = Server((host, port), self.handler())
+        self._runner = None
+
+    @property
+    def url(self) -> str:
+        """rpc of protocol: "http://127.0.0.1:port/v1" """
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "MockServer":
+        self._runner = threading.Thread(target=self.server.serve_forever, name="MockServer", daemon=True)
+        self._runner.start()
+
+        return self
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        if self._runner is not None:
+            self._runner.join()
+            self._runner = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # < Catalog >
+
+    def generate(self, countries: int, products: int, operators: int) -> dict:
+        """{country: {product: {operator: {"cost", "count"}}}}, first names are real ones"""
+        countries = (["russia", "england", "usa"] + [f"country{i}" for i in range(countries)])[:countries]
+        products = (["tinder", "telegram", "vkontakte"] + [f"product{i}" for i in range(products)])[:products]
+        operators = (["any", "beeline", "mts"] + [f"operator{i}" for i in range(operators)])[:operators]
+
+        return {
+            country: {
+                product: {
+                    operator: {
+                        "cost": round(self.random.uniform(1, 50), 2),
+                        "count": self.random.randint(0, 5000)}
+                    for operator in operators}
+                for product in products}
+            for country in countries}
+
+    def prices(self, country: str = None, product: str = None) -> dict:
+        if country and product:
+            return {country: {product: self.catalog.get(country, {}).get(product, {})}}
+        if country:
+            return {country: self.catalog.get(country, {})}
+        if product:
+            return {product: {country: products[product] for country, products in self.catalog.items() if product in products}}
+
+        return self.catalog
+
+    def products(self, country: str, operator: str) -> dict:
+        countries = self.catalog.values() if country == "any" else [self.catalog.get(country, {})]
+        result = {}
+        for products in countries:
+            for product, operators in products.items():
+                price = operators.get(operator) or next(iter(operators.values()))
+                result[product] = {"Category": "activation", "Qty": price["count"], "Price": price["cost"]}
+
+        return result
+
+    def countries(self) -> dict:
+        return {
+            country: {
+                "iso": {country[:2]: 1},
+                "prefix": {"+7": 1},
+                "text_en": country.title(),
+                "text_ru": country.title(),
+                **{operator: {"activation": 1} for operator in next(iter(products.values()))}}
+            for country, products in self.catalog.items()}
+
+    # < END Catalog >
+
+    # < Orders >
+
+    def buy(self, country: str, operator: str, product: str):
+        """(status, body) of buy request"""
+        if country != "any" and country not in self.catalog:
+            return 400, Errors.BAD_COUNTRY
+
+        products = self.catalog.get("russia" if country == "any" else country, {})
+        if product not in products:
+            return 400, Errors.NO_PRODUCT
+
+        operators = products[product]
+        if operator not in operators:
+            return 400, Errors.BAD_OPERATOR
+
+        price = operators[operator]["cost"]
+        now = time.time()
+        with self._lock:
+            if self.balance < price:
+                return 400, Errors.NOT_ENOUGH_USER_BALANCE
+
+            self.balance -= price
+            self.next_id += 1
+            order = self.orders[self.next_id] = {
+                "id": self.next_id,
+                "phone": f"+7900{self.next_id % 10000000:07d}",
+                "operator": operator,
+                "product": product,
+                "price": price,
+                "status": "PENDING",
+                "expires": timestamp(now + ORDER_TTL),
+                "sms": None,
+                "created_at": timestamp(now),
+                "forwarding": False,
+                "forwarding_number": "",
+                "country": "russia" if country == "any" else country,
+                "_bought": now
+            }
+
+        return 200, order
+
+    def order(self, id: str):
+        """Order of id with delivered sms, None if there is no one"""
+        try:
+            order = self.orders[int(id)]
+        except (KeyError, ValueError):
+            return None
+
+        if self.sms_after is not None and order["status"] == "PENDING" and time.time() - order["_bought"] >= self.sms_after:
+            order["status"] = "RECEIVED"
+            order["sms"] = [{
+                "id": order["id"],
+                "created_at": timestamp(time.time()),
+                "date": timestamp(time.time()),
+                "sender": "Tinder",
+                "text": f"Your code is {order['id'] % 1000000:06d}",
+                "code": f"{order['id'] % 1000000:06d}"
+            }]
+
+        return order
+
+    def change(self, id: str, status: str):
+        """(status, body) of finish / cancel / ban request"""
+        with self._lock:
+            order = self.order(id)
+            if order is None:
+                return 404, Errors.ERROR_404
+            if order["status"] not in ("PENDING", "RECEIVED"):
+                return 400, Errors.ORDER_EXPIRED
+            if status == "CANCELED" and order["sms"]:
+                return 400, Errors.ORDER_HAS_SMS
+            if status == "FINISHED" and not order["sms"]:
+                return 400, Errors.ORDER_NO_SMS
+
+            order["status"] = status
+            if status == "CANCELED":
+                self.balance += order["price"]
+
+        return 200, order
+
+    def history(self, query: dict) -> dict:
+        limit = int(query.get("limit", 15))
+        offset = int(query.get("offset", 0))
+        with self._lock:
+            ids = sorted(self.orders, reverse=query.get("reverse", "").lower() == "true")
+            data = [
+                {key: value for key, value in self.order(id).items() if not key.startswith("_")}
+                for id in ids[offset:offset + limit]]
+
+        return {"Data": data, "ProductNames": [], "Statuses": [], "Total": len(ids)}
+
+    # < END Orders >
+
+    def inject(self, path: str):
+        """(status, body) of injected error for :path:, None - no error"""
+        for prefix, probability, status, body in self.errors:
+            if path.startswith(prefix):
+                with self._lock:
+                    hit = self.random.random() < probability
+                if hit:
+                    return status, body
+
+        return None
+
+    def route(self, path: str, query: dict, authorized: bool):
+        """(status, body) of request, body is dict / str / bytes"""
+        parts = path.strip("/").split("/")[1:] # without "v1"
+
+        if parts[:1] == ["guest"]:
+            if parts[1:2] == ["prices"]:
+                key = (query.get("country"), query.get("product"))
+                if key not in self._cache: # full catalog is megabytes, encode it once
+                    self._cache[key] = json.dumps(self.prices(*key)).encode()
+                return 200, self._cache[key]
+            if parts[1:2] == ["products"] and len(parts) == 4:
+                return 200, self.products(parts[2], parts[3])
+            if parts[1:2] == ["countries"]:
+                return 200, self.countries()
+            if parts[1:2] == ["flash"]:
+                return 200, {"text": "Mock server"}
+
+        if parts[:1] == ["user"]:
+            if not authorized:
+                return 401, ""
+            if parts[1:2] == ["profile"]:
+                return 200, {"id": 1, "email": "mock@localhost", "balance": round(self.balance, 2), "rating": 96,
+                    "default_country": {"name": "russia", "iso": "ru", "prefix": "+7"}, "default_operator": {"name": "any"},
+                    "frozen_balance": 0}
+            if parts[1:3] in (["buy", "activation"], ["buy", "hosting"]) and len(parts) == 6:
+                return self.buy(parts[3], parts[4], parts[5])
+            if parts[1:2] == ["check"] and len(parts) == 3:
+                with self._lock:
+                    order = self.order(parts[2])
+                return (200, order) if order is not None else (404, Errors.ORDER_NOT_FOUND)
+            if parts[1:2] in (["finish"], ["cancel"], ["ban"]) and len(parts) == 3:
+                return self.change(parts[2], {"finish": "FINISHED", "cancel": "CANCELED", "ban": "BANNED"}[parts[1]])
+            if parts[1:3] == ["sms", "inbox"] and len(parts) == 4:
+                with self._lock:
+                    order = self.order(parts[3])
+                return (200, {"Data": order["sms"] or [], "Total": len(order["sms"] or [])}) if order else (404, Errors.ERROR_404)
+            if parts[1:2] == ["orders"]:
+                return 200, self.history(query)
+            if parts[1:2] == ["payments"]:
+                return 200, {"Data": [], "PaymentTypes": [], "PaymentProviders": [], "Total": 0}
+
+        return 404, Errors.ERROR_404
+
+    def handler(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # keep-alive, as 5sim
+            disable_nagle_algorithm = True # headers and body are separate writes
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                if server.latency:
+                    time.sleep(server.random.uniform(*server.latency) if isinstance(server.latency, tuple) else server.latency)
+
+                url = urlsplit(self.path)
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                status, body = server.inject(url.path) or server.route(
+                    url.path, query, self.headers.get("Authorization", "").startswith("Bearer "))
+
+                if isinstance(body, dict):
+                    body = json.dumps({key: value for key, value in body.items() if not key.startswith("_")}).encode()
+                elif isinstance(body, str):
+                    body = str.__str__(body).encode()
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json" if body[:1] in (b"{", b"[") else "text/plain")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
@@ -0,0 +1,99 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PageSize:
+    """Adaptive page size, doubles on fast pages and halves on slow ones..
+    :limit: First page size.\n
+    :min_limit: Min page size.\n
+    :max_limit: Max page size.\n
+    :target: Wanted duration of one page request, in seconds.\n
+    """
+    __slots__ = ("limit", "min_limit", "max_limit", "target")
+
+    def __init__(self, limit: int = 100, min_limit: int = 10, max_limit: int = 1000, target: float = 1.0):
+        self.limit = limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target = target
+
+    def feed(self, elapsed: float) -> int:
+        """Adjust size by duration of last page request, returns next size"""
+        if elapsed < self.target / 2:
+            self.limit = min(self.limit * 2, self.max_limit)
+        elif elapsed > self.target:
+            self.limit = max(self.limit // 2, self.min_limit)
+
+        return self.limit
+
+
+def _timed(fetch, limit: int, offset: int) -> tuple:
+    started = time.monotonic()
+    page = fetch(limit=limit, offset=offset)
+    return page, time.monotonic() - started
+
+
+async def _atimed(fetch, limit: int, offset: int) -> tuple:
+    started = time.monotonic()
+    page = await fetch(limit=limit, offset=offset)
+    return page, time.monotonic() - started
+
+
+def iter_pages(fetch, size: PageSize = None, offset: int = 0):
+    """Yields items of "Data" of all pages lazily..
+    Next page is requested in background while current one is consumed, walk stops on "Total".\n
+
+    :fetch: Callable with limit and offset kwargs, returns page dict like :meth:`Type_5simProtocol.orders`.\n
+    :size: (optional) :class:`PageSize`.\n
+    :offset: First item offset.\n
+    """
+    size = size or PageSize()
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        page, elapsed = _timed(fetch, size.limit, offset)
+        while True:
+            data = page.get("Data") or []
+            offset += len(data)
+
+            following = None
+            if data and offset < page.get("Total", 0):
+                following = executor.submit(_timed, fetch, size.feed(elapsed), offset)
+
+            page = None # keep one page in memory at once
+            yield from data
+            del data
+
+            if following is None:
+                return
+
+            page, elapsed = following.result()
+
+
+async def aiter_pages(fetch, size: PageSize = None, offset: int = 0):
+    """Async :func:`iter_pages`, :fetch: returns coroutine"""
+    size = size or PageSize()
+
+    page, elapsed = await _atimed(fetch, size.limit, offset)
+    while True:
+        data = page.get("Data") or []
+        offset += len(data)
+
+        following = None
+        if data and offset < page.get("Total", 0):
+            following = asyncio.ensure_future(_atimed(fetch, size.feed(elapsed), offset))
+
+        page = None
+        try:
+            for item in data:
+                yield item
+        except GeneratorExit: # consumer stopped early
+            if following is not None:
+                following.cancel()
+            raise
+        del data
+
+        if following is None:
+            return
+
+        page, elapsed = await following
@@ -0,0 +1,370 @@
+import codecs
+import json
+import re
+import sys
+from array import array
+from bisect import bisect_right
+from typing import NamedTuple
+
+from data import Country, Product, Operator
+
+
+class Offer(NamedTuple):
+    """One (country, product, operator) price of :class:`PriceBook`"""
+    country: Country
+    product: Product
+    operator: Operator
+    cost: float
+    count: int
+
+
+class Codes:
+    """Interned names table, name <-> small int code"""
+    __slots__ = ("names", "codes")
+
+    def __init__(self):
+        self.names = []
+        self.codes = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, code: int) -> str:
+        return self.names[code]
+
+    def get(self, name: str) -> int:
+        return self.codes.get(str.__str__(name)) # plain str, catalog members are interned by their value
+
+    def code(self, name: str) -> int:
+        name = str.__str__(name)
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.names)
+            self.names.append(sys.intern(name))
+
+        return code
+
+
+def iter_rows(prices: dict, product_first: bool = False):
+    """Flatten :meth:`Type_5simProtocol.prices` payload to (country, product, operator, cost, count) rows..
+    :product_first: payload of prices by product is product -> country -> operator.\n
+    """
+    for outer, inner in prices.items():
+        for middle, operators in inner.items():
+            country, product = (middle, outer) if product_first else (outer, middle)
+            for operator, offer in operators.items():
+                yield country, product, operator, offer.get("cost", 0), offer.get("count", 0)
+
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+_decoder = json.JSONDecoder()
+
+
+class RowParser:
+    """Incremental parser of :meth:`Type_5simProtocol.prices` body..
+    Bytes are fed as they arrive and rows are returned as soon as their operator object is complete.
+    Only unparsed tail of body is buffered, so memory does not grow with payload size.\n
+
+    :product_first: payload of prices by product is product -> country -> operator.\n
+    """
+    __slots__ = ("product_first", "text", "buffer", "path", "key", "state")
+
+    def __init__(self, product_first: bool = False):
+        self.product_first = product_first
+        self.text = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.path = []      # keys of open objects above operators
+        self.key = None     # last read key
+        self.state = "start"
+
+    def feed(self, chunk: bytes) -> list:
+        """Parse next chunk of body, returns completed (country, product, operator, cost, count) rows"""
+        return self._consume(self.text.decode(chunk))
+
+    def close(self) -> list:
+        """End of body, returns last rows, raises :class:`ValueError` on truncated body"""
+        rows = self._consume(self.text.decode(b"", final=True))
+        if self.state != "end" or self.buffer.strip():
+            raise ValueError(f"Truncated prices body, parser stopped at {self.state!r}")
+
+        return rows
+
+    def _consume(self, text: str) -> list:
+        self.buffer += text
+        rows = []
+        position = self._parse(rows)
+        self.buffer = self.buffer[position:] # keep only unparsed tail
+
+        return rows
+
+    def _parse(self, rows: list) -> int:
+        buffer, position = self.buffer, 0
+        while True:
+            position = _WHITESPACE.match(buffer, position).end()
+            if position >= len(buffer) or self.state == "end":
+                return position
+
+            char = buffer[position]
+            state = self.state
+
+            if state == "start":
+                if char != "{":
+                    raise ValueError(f"Expected object at start of prices body, got {char!r}")
+                position += 1
+                self.state = "first key"
+
+            elif state == "key" or state == "first key":
+                if char == "}" and state == "first key": # empty object
+                    position += 1
+                    self._close()
+                    continue
+                try:
+                    self.key, position = _decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    return position # key is not complete yet
+                self.state = "colon"
+
+            elif state == "colon":
+                if char != ":":
+                    raise ValueError(f"Expected ':' in prices body, got {char!r}")
+                position += 1
+                self.state = "leaf" if len(self.path) == 2 else "object"
+
+            elif state == "object":
+                if char == "{":
+                    position += 1
+                    self.path.append(self.key)
+                    self.key = None
+                    self.state = "first key"
+                    continue
+                try: # not an object, skip it
+                    _, position = _decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    return position
+                self.state = "next"
+
+            elif state == "leaf":
+                try:
+                    offer, position = _decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    return position # operator object is not complete yet
+                if isinstance(offer, dict):
+                    rows.append(self._row(offer))
+                self.state = "next"
+
+            elif state == "next":
+                if char not in ",}":
+                    raise ValueError(f"Expected ',' or '}}' in prices body, got {char!r}")
+                position += 1
+                if char == ",":
+                    self.state = "key"
+                else:
+                    self._close()
+
+    def _close(self) -> None:
+        # end of object at current depth
+        if self.path:
+            self.key = self.path.pop()
+            self.state = "next"
+        else:
+            self.state = "end"
+
+    def _row(self, offer: dict) -> tuple:
+        outer, middle = self.path
+        country, product = (middle, outer) if self.product_first else (outer, middle)
+        return country, product, self.key, offer.get("cost", 0), offer.get("count", 0)
+
+
+def iter_stream_rows(chunks, product_first: bool = False):
+    """Yields (country, product, operator, cost, count) rows of prices body given by byte :chunks:"""
+    parser = RowParser(product_first)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+
+    yield from parser.close()
+
+
+async def aiter_stream_rows(chunks, product_first: bool = False):
+    """Async :func:`iter_stream_rows`, :chunks: is async iterator"""
+    parser = RowParser(product_first)
+    async for chunk in chunks:
+        for row in parser.feed(chunk):
+            yield row
+
+    for row in parser.close():
+        yield row
+
+
+class PriceBook:
+    """Indexed in-memory copy of :meth:`Type_5simProtocol.prices`..
+    Rows are stored in columns (interned codes, float / int arrays) and indexed by product and cost,
+    so cheapest-offer queries do not walk the whole catalog.\n
+
+    :response example: PriceBook.from_prices(protocol.prices()).cheapest(Product.TINDER, n=3)
+    """
+    def __init__(self):
+        self.countries = Codes()
+        self.products = Codes()
+        self.operators = Codes()
+
+        # columns, one item per row
+        self.country = array("H")
+        self.product = array("H")
+        self.operator = array("H")
+        self.cost = array("d")
+        self.count = array("i")
+
+        self.rows = {}          # packed (country, product, operator) codes -> row
+        self.product_rows = {}  # product code -> rows of product
+        self.by_product = {}    # product code -> (rows sorted by cost, their costs)
+        self.in_stock = {}      # product code -> rows with count > 0 sorted by cost
+        self.by_cost = array("I")   # all rows sorted by cost, rebuilt lazily by under()
+        self.costs = array("d")     # costs of by_cost, for bisect
+        self.minima = {}        # product code -> {country code: row of cheapest offer in stock}
+
+        self._dirty = set()     # product codes with stale indexes
+        self._costs_dirty = False   # by_cost is stale
+
+    def __len__(self):
+        return len(self.cost)
+
+    @classmethod
+    def from_prices(cls, prices: dict, product_first: bool = False) -> "PriceBook":
+        return cls().update(prices, product_first)
+
+    @classmethod
+    def from_rows(cls, rows) -> "PriceBook":
+        return cls().update_rows(rows)
+
+    def update(self, prices: dict, product_first: bool = False, partial: bool = False) -> "PriceBook":
+        """Refresh from newer :meth:`Type_5simProtocol.prices` payload..
+        :partial: payload is filtered by country or product, rows missing in it are kept.\n
+        """
+        return self.update_rows(iter_rows(prices, product_first), partial)
+
+    def update_rows(self, rows, partial: bool = False) -> "PriceBook":
+        """Refresh from (country, product, operator, cost, count) rows, reindexes changed products only..
+        :partial: rows are not full snapshot, missing rows are kept, otherwise they go out of stock.\n
+        """
+        seen = set()
+        for country, product, operator, cost, count in rows:
+            c, p, o = self.countries.code(country), self.products.code(product), self.operators.code(operator)
+            key = c << 32 | p << 16 | o
+            row = self.rows.get(key)
+
+            if row is None:
+                row = self.rows[key] = len(self.cost)
+                self.product_rows.setdefault(p, array("I")).append(row)
+                self.country.append(c)
+                self.product.append(p)
+                self.operator.append(o)
+                self.cost.append(cost)
+                self.count.append(count)
+                self._dirty.add(p)
+                self._costs_dirty = True
+            else:
+                if self.cost[row] != cost:
+                    self._dirty.add(p)
+                    self._costs_dirty = True
+                elif (self.count[row] > 0) != (count > 0):
+                    self._dirty.add(p)
+                self.cost[row] = cost
+                self.count[row] = count
+
+            if not partial:
+                seen.add(row)
+
+        if not partial:
+            for row in range(len(self.cost)):
+                if row not in seen and self.count[row]:
+                    self.count[row] = 0
+                    self._dirty.add(self.product[row])
+
+        self._index()
+        return self
+
+    def _index(self) -> None:
+        if not self._dirty:
+            return
+
+        cost = self.cost.__getitem__
+        for p in self._dirty:
+            rows = array("I", sorted(self.product_rows[p], key=cost))
+            self.by_product[p] = rows, array("d", map(cost, rows))
+            stock = self.in_stock[p] = array("I", (row for row in rows if self.count[row] > 0))
+
+            minima = self.minima[p] = {}
+            for row in stock:
+                minima.setdefault(self.country[row], row)
+
+        self._dirty.clear()
+
+    def _index_costs(self) -> None:
+        # sort of whole book is paid by first query over all products, not by every update
+        if not self._costs_dirty:
+            return
+
+        cost = self.cost.__getitem__
+        self.by_cost = array("I", sorted(range(len(self.cost)), key=cost))
+        self.costs = array("d", map(cost, self.by_cost))
+        self._costs_dirty = False
+
+    def offer(self, row: int) -> Offer:
+        return Offer(
+            self.countries[self.country[row]],
+            self.products[self.product[row]],
+            self.operators[self.operator[row]],
+            self.cost[row],
+            self.count[row])
+
+    def get(self, country: Country, product: Product, operator: Operator) -> Offer:
+        """Offer by exact (country, product, operator) or None"""
+        c, p, o = self.countries.get(country), self.products.get(product), self.operators.get(operator)
+        if c is None or p is None or o is None:
+            return None
+
+        row = self.rows.get(c << 32 | p << 16 | o)
+        return None if row is None else self.offer(row)
+
+    def cheapest(self, product: Product, n: int = 1, max_cost: float = None, where = None) -> list:
+        """Cheapest :n: offers in stock for :product:, optionally not more expensive than :max_cost:..
+        :where: (optional) Callable of :class:`Offer`, only offers it accepts are counted.\n
+        """
+        p = self.products.get(product)
+        if p is None:
+            return []
+
+        offers = []
+        for row in self.in_stock[p] if where is not None else self.in_stock[p][:n]:
+            if max_cost is not None and self.cost[row] > max_cost:
+                break
+            offer = self.offer(row)
+            if where is not None and not where(offer):
+                continue
+            offers.append(offer)
+            if len(offers) == n:
+                break
+
+        return offers
+
+    def under(self, max_cost: float, product: Product = None, in_stock: bool = True) -> list:
+        """All offers with cost <= :max_cost:, cheapest first"""
+        if product is not None:
+            p = self.products.get(product)
+            if p is None:
+                return []
+            rows, costs = self.by_product[p]
+            rows = rows[:bisect_right(costs, max_cost)]
+        else:
+            self._index_costs()
+            rows = self.by_cost[:bisect_right(self.costs, max_cost)]
+
+        return [self.offer(row) for row in rows if not in_stock or self.count[row] > 0]
+
+    def country_minima(self, product: Product) -> dict:
+        """Cheapest offer in stock per country for :product:, {country: :class:`Offer`}"""
+        p = self.products.get(product)
+        if p is None:
+            return {}
+
+        return {self.countries[c]: self.offer(row) for c, row in self.minima.get(p, {}).items()}
@@ -0,0 +1,186 @@
+import time
+
+from data import Country, Product, Operator, Status
+from exceptions import NoFreePhonesError, BadOperatorError, BadCountryError, NoProductError
+from pricebook import PriceBook, Offer
+from catalog import Catalog
+from _types import SimOrder
+
+# errors after which next (country, operator) is tried
+FALLOVER = (NoFreePhonesError, BadOperatorError, BadCountryError)
+
+# errors of pair missing in server catalog
+STALE = (BadOperatorError, BadCountryError)
+
+
+class PairStats:
+    """Observed purchases of one (country, operator)"""
+    __slots__ = ("bought", "settled", "received")
+
+    def __init__(self):
+        self.bought = 0
+        self.settled = 0    # bought orders which got sms or final status
+        self.received = 0
+
+
+class BuyRouter:
+    """Picks (country, operator) for :meth:`Type_5simProtocol.buy`..
+    Candidates are ranked by cost divided by observed SMS arrival rate of the pair
+    and tried in order, falling over on :class:`NoFreePhonesError` / :class:`BadOperatorError`.\n
+
+    :protocol: :class:`Type_5simProtocol` used for prices and purchases.\n
+    :book: (optional) :class:`PriceBook` shared with other routers.\n
+    :max_age: Refresh prices of product older than this, in seconds.\n
+    :prior: (received, settled) added to stats of every pair, rate of unknown pair is 1 / 2.\n
+    :catalog: (optional) :class:`Catalog`, pairs missing in it are not tried.\n
+    """
+    def __init__(self,
+        protocol,
+        book: PriceBook = None,
+        max_age: float = 60,
+        prior: tuple = (1, 2),
+        catalog: Catalog = None):
+        self.protocol = protocol
+        self.book = book or PriceBook()
+        self.max_age = max_age
+        self.prior = prior
+        self.catalog = catalog
+
+        self.stats = {}     # (country, operator) -> PairStats
+        self.updated = {}   # product -> time of last prices refresh
+        self.pending = {}   # order id -> PairStats of bought order without sms yet
+
+    def stale(self, product: Product) -> bool:
+        return time.monotonic() - self.updated.get(str.__str__(product), float("-inf")) > self.max_age
+
+    def refresh(self, prices: dict, product: Product) -> None:
+        """Load :meth:`Type_5simProtocol.prices` payload of one product"""
+        self.book.update(prices, product_first=True, partial=True)
+        self.updated[str.__str__(product)] = time.monotonic()
+
+    def pair(self, country: Country, operator: str) -> PairStats:
+        key = (str.__str__(country), str.__str__(operator))
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = PairStats()
+
+        return stats
+
+    def rate(self, country: Country, operator: str) -> float:
+        """Share of settled orders of the pair that received SMS..
+        Orders still waiting for sms are not counted, pairs without settled orders have the same prior rate.
+        """
+        stats = self.pair(country, operator)
+        return (stats.received + self.prior[0]) / (stats.settled + self.prior[1])
+
+    def rank(self,
+        product: Product,
+        max_price: float = None,
+        countries: list = None,
+        limit: int = 5,
+        candidates: int = 50) -> list:
+        """Best :limit: offers in stock for :product:..
+        :max_price: (optional) Max cost of number.\n
+        :countries: (optional) Only these countries.\n
+        :candidates: How many cheapest offers are reranked by arrival rate.\n
+        """
+        if countries is not None:
+            countries = {str.__str__(country) for country in countries}
+
+        def allowed(offer: Offer) -> bool:
+            return (countries is None or offer.country in countries) \
+                and (self.catalog is None or self.catalog.has_operator(offer.country, offer.operator))
+
+        # filter before truncating, cheaper offers of other countries must not take all candidates
+        offers = self.book.cheapest(product, n=candidates, max_cost=max_price, where=allowed)
+        offers.sort(key=lambda offer: offer.cost / self.rate(offer.country, offer.operator))
+
+        return offers[:limit]
+
+    def record(self, order: SimOrder) -> None:
+        """Count SMS arrival of order bought by :meth:`buy_best`, called by protocol for every order response..
+        Order is counted once, when it gets sms or final status.
+        """
+        if order.status == Status.PENDING or order.id not in self.pending:
+            return
+
+        stats = self.pending.pop(order.id, None)
+        if stats is not None:
+            stats.settled += 1
+            if order.sms or order.status == Status.RECEIVED:
+                stats.received += 1
+
+    def bought(self, offer: Offer, order: SimOrder) -> SimOrder:
+        stats = self.pending[order.id] = self.pair(offer.country, offer.operator)
+        stats.bought += 1
+        return order
+
+    def failed(self, offer: Offer, error: Exception) -> None:
+        # do not offer this pair again until next prices refresh
+        self.book.update_rows([(offer.country, offer.product, offer.operator, offer.cost, 0)], partial=True)
+        if self.catalog is not None and isinstance(error, STALE):
+            self.catalog.forget(offer.country, offer.operator if isinstance(error, BadOperatorError) else None)
+
+    def check(self, product: Product) -> None:
+        # product removed from server catalog would fail on every pair
+        if self.catalog is not None and not self.catalog.has_product(product):
+            raise NoProductError("No product")
+
+    def buy_best(self,
+        product: Product,
+        max_price: float = None,
+        countries: list = None,
+        attempts: int = 5,
+        **kwargs) -> SimOrder:
+        """Buy activation number in best (country, operator)..
+        Returns :class:`SimOrder` object.\n
+
+        :product: :class:`Product` name.\n
+        :max_price: (optional) Max cost of number.\n
+        :countries: (optional) Only these countries.\n
+        :attempts: Max count of tried pairs.\n
+        :kwargs: (optional) Passed to :meth:`Type_5simProtocol.buy`.\n
+        """
+        self.check(product)
+        if self.stale(product):
+            self.refresh(self.protocol.prices(product=product), product)
+
+        error = None
+        for offer in self.rank(product, max_price, countries, limit=attempts):
+            try:
+                order = self.protocol.buy(product, offer.country, offer.operator, **kwargs)
+            except FALLOVER as fallover:
+                error = fallover
+                self.failed(offer, fallover)
+                continue
+
+            return self.bought(offer, order)
+
+        raise error or NoFreePhonesError("No free phones")
+
+
+class AsyncBuyRouter(BuyRouter):
+    """Asyncio twin of :class:`BuyRouter` for :class:`AsyncType_5simProtocol`"""
+    async def buy_best(self,
+        product: Product,
+        max_price: float = None,
+        countries: list = None,
+        attempts: int = 5,
+        **kwargs) -> SimOrder:
+        """Async :meth:`BuyRouter.buy_best`"""
+        self.check(product)
+        if self.stale(product):
+            self.refresh(await self.protocol.prices(product=product), product)
+
+        error = None
+        for offer in self.rank(product, max_price, countries, limit=attempts):
+            try:
+                order = await self.protocol.buy(product, offer.country, offer.operator, **kwargs)
+            except FALLOVER as fallover:
+                error = fallover
+                self.failed(offer, fallover)
+                continue
+
+            return self.bought(offer, order)
+
+        raise error or NoFreePhonesError("No free phones")
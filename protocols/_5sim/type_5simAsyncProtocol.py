@@ -0,0 +1,413 @@
+from req import AsyncSession
+from limiter import RateLimiter
+from cache import ResponseCache
+from metrics import Metrics
+from tracing import Tracer, traced
+from data import (
+    URL, ApiKey, Category,
+    Limit, Offset, Order, Country,
+    Operator, Product, Number, OrderId,
+    Lang
+)
+from _types import AsyncSimOrder
+from type_5simProtocol import Type_5simProtocol
+from router import AsyncBuyRouter
+from batch import BatchResult, arepeat, aeach
+from paginator import PageSize, aiter_pages
+from pricebook import aiter_stream_rows
+from db import OrderStore
+from catalog import AsyncCatalog
+from events import AsyncEventStream
+
+@traced
+class AsyncType_5simProtocol(Type_5simProtocol):
+    """
+    Service: 5sim (asyncio)
+    link: https://5sim.net/
+    docs: https://docs.5sim.net
+
+    Same methods as :class:`Type_5simProtocol`, but every method is a coroutine.
+    All requests share one keep-alive connection pool, so thousands of
+    concurrent calls can run on one event loop.
+
+    :limit: Max connections in the pool, 0 - unlimited.\n
+    :limit_per_host: Max connections to 5sim host, 0 - unlimited.\n
+    :limiter: (optional) :class:`RateLimiter` of session.\n
+    :cache: (optional) :class:`ResponseCache` for guest catalogs (prices, products, countries, notifications).\n
+    :store: (optional) :class:`OrderStore` recording every returned order state.\n
+    :metrics: (optional) :class:`Metrics` of requests by endpoint.\n
+    :tracer: (optional) :class:`Tracer` with hooks around requests and methods of protocol.\n
+    """
+    name = "5sim-async"
+    order_class = AsyncSimOrder
+
+    def __init__(self,
+        key: ApiKey,
+        rpc: URL = "https://5sim.net/v1",
+        limit: int = 100,
+        limit_per_host: int = 0,
+        limiter: RateLimiter = None,
+        cache: ResponseCache = None,
+        store: OrderStore = None,
+        metrics: Metrics = None,
+        tracer: Tracer = None):
+        self.session = AsyncSession(limit=limit, limit_per_host=limit_per_host, limiter=limiter, cache=cache, metrics=metrics, tracer=tracer)
+        self.session.headers({
+            "Authorization": f"Bearer {key}",
+            "Accept": "application/json"
+        })
+
+        self.rpc = rpc
+        self.router = AsyncBuyRouter(self)
+        self.store = store
+        self.catalog = None
+        self.tracer = tracer
+
+    async def close(self) -> None:
+        """Close shared connection pool"""
+        if self.catalog is not None:
+            await self.catalog.close()
+        await self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # < User >
+
+    async def balance(self) -> dict:
+        """Async :meth:`Type_5simProtocol.balance`"""
+        return (await self.session.get(
+            self.rpc + "/user/profile"
+            )).json
+
+    async def profile(self) -> dict:
+        """Hook to balance()"""
+        return await self.balance()
+
+    async def orders(self,
+        category: Category,
+        limit: Limit = None,
+        offset: Offset = None,
+        order: Order = None,
+        reverse: bool = None) -> dict:
+        """Async :meth:`Type_5simProtocol.orders`"""
+        params = {
+            "category": category,
+            "limit": limit,
+            "offset": offset,
+            "order": order,
+            "reverse": reverse
+        }
+
+        return (await self.session.get(
+            self.rpc + "/user/orders",
+            params = {k: v for k, v in params.items() if v is not None} # remove None items
+            )).json
+
+    async def payments(self,
+        limit: Limit = None,
+        offset: Offset = None,
+        order: Order = None,
+        reverse: bool = None) -> dict:
+        """Async :meth:`Type_5simProtocol.payments`"""
+        params = {
+            "limit": limit,
+            "offset": offset,
+            "order": order,
+            "reverse": reverse
+        }
+
+        return (await self.session.get(
+            self.rpc + "/user/payments",
+            params = {k: v for k, v in params.items() if v is not None} # remove None items
+            )).json
+
+    def iter_orders(self,
+        category: Category,
+        order: Order = None,
+        reverse: bool = None,
+        size: PageSize = None):
+        """Async :meth:`Type_5simProtocol.iter_orders`, use with `async for`"""
+        return aiter_pages(
+            lambda limit, offset: self.orders(category, limit, offset, order, reverse),
+            size)
+
+    def iter_payments(self,
+        order: Order = None,
+        reverse: bool = None,
+        size: PageSize = None):
+        """Async :meth:`Type_5simProtocol.iter_payments`, use with `async for`"""
+        return aiter_pages(
+            lambda limit, offset: self.payments(limit, offset, order, reverse),
+            size)
+
+    # < END User >
+
+    # < Products and prices >
+
+    async def products(self, country: Country, operator: Operator) -> dict:
+        """Async :meth:`Type_5simProtocol.products`"""
+        return (await self.session.get(
+            self.rpc + f"/guest/products/{country}/{operator}",
+            )).json
+
+    async def prices(self, country: Country=None, product: Product=None) -> dict:
+        """Async :meth:`Type_5simProtocol.prices`"""
+        params = {
+            'country': country,
+            'product': product
+        }
+        return (await self.session.get(
+            self.rpc + f"/guest/prices",
+            params = {k:v for k, v in params.items() if v is not None} # remove None items
+            )).json
+
+    def iter_prices(self, country: Country = None, product: Product = None, chunk_size: int = 65536):
+        """Async :meth:`Type_5simProtocol.iter_prices`, use with `async for`"""
+        params = {
+            'country': country,
+            'product': product
+        }
+        return aiter_stream_rows(
+            self.session.stream(
+                self.rpc + f"/guest/prices",
+                chunk_size = chunk_size,
+                params = {k:v for k, v in params.items() if v is not None} # remove None items
+                ),
+            product_first = product is not None and country is None)
+
+    # < END Products and prices >
+
+    # < Purchase >
+
+    async def buy(self,
+        product: Product,
+        country: Country = Country.ANY,
+        operator: Operator = Operator.ANY,
+        forwarding: str = None,
+        number: Number = None,
+        reuse: int = None,
+        voice: int = None,
+        ref: str = None) -> AsyncSimOrder:
+        """Async :meth:`Type_5simProtocol.buy`"""
+        params = {
+            'forwarding': forwarding,
+            'number': number,
+            'reuse': reuse,
+            'voice': voice,
+            'ref': ref
+        }
+
+        return self._order((await self.session.get(
+            self.rpc + f"/user/buy/activation/{country}/{operator}/{product}",
+            params = {k:v for k, v in params.items() if v is not None} # remove None items
+            )).json)
+
+    async def buy_hosting(self,
+        product: Product,
+        country: Country = Country.ANY,
+        operator: Operator = Operator.ANY,
+        ) -> AsyncSimOrder:
+        """Async :meth:`Type_5simProtocol.buy_hosting`"""
+        return self._order((await self.session.get(
+            self.rpc + f"/user/buy/hosting/{country}/{operator}/{product}",
+            )).json)
+
+    async def reuse(self, product: Product, number: Number) -> AsyncSimOrder:
+        """Async :meth:`Type_5simProtocol.reuse`"""
+        return self._order((await self.session.get(
+            self.rpc + f"/user/reuse/{product}/{number}",
+            )).json)
+
+    async def buy_best(self,
+        product: Product,
+        max_price: float = None,
+        countries: list = None,
+        attempts: int = 5,
+        **kwargs) -> AsyncSimOrder:
+        """Async :meth:`Type_5simProtocol.buy_best`"""
+        return await self.router.buy_best(product, max_price, countries, attempts, **kwargs)
+
+    async def buy_many(self,
+        product: Product,
+        n: int,
+        country: Country = Country.ANY,
+        operator: Operator = Operator.ANY,
+        concurrency: int = 10,
+        max_failures: int = None,
+        **kwargs) -> BatchResult:
+        """Async :meth:`Type_5simProtocol.buy_many`"""
+        return await arepeat(
+            lambda: self.buy(product, country, operator, **kwargs),
+            n, concurrency, max_failures)
+
+    # < END Purchase >
+
+    # < Order managment >
+
+    async def check(self, id: OrderId, into: AsyncSimOrder = None) -> AsyncSimOrder:
+        """Async :meth:`Type_5simProtocol.check`"""
+        return self._order((await self.session.get(
+            self.rpc + f"/user/check/{id}",
+            )).json, into)
+
+    async def finish(self, id: OrderId, into: AsyncSimOrder = None) -> AsyncSimOrder:
+        """Async :meth:`Type_5simProtocol.finish`"""
+        return self._order((await self.session.get(
+            self.rpc + f"/user/finish/{id}",
+            )).json, into)
+
+    async def cancel(self, id: OrderId, into: AsyncSimOrder = None) -> AsyncSimOrder:
+        """Async :meth:`Type_5simProtocol.cancel`"""
+        return self._order((await self.session.get(
+            self.rpc + f"/user/cancel/{id}",
+            )).json, into)
+
+    async def ban(self, id: OrderId, into: AsyncSimOrder = None) -> AsyncSimOrder:
+        """Async :meth:`Type_5simProtocol.ban`"""
+        return self._order((await self.session.get(
+            self.rpc + f"/user/ban/{id}",
+            )).json, into)
+
+    async def finish_many(self, ids: list, concurrency: int = 10) -> list:
+        """Async :meth:`Type_5simProtocol.finish_many`"""
+        return await aeach(self.finish, ids, concurrency)
+
+    async def cancel_many(self, ids: list, concurrency: int = 10) -> list:
+        """Async :meth:`Type_5simProtocol.cancel_many`"""
+        return await aeach(self.cancel, ids, concurrency)
+
+    async def ban_many(self, ids: list, concurrency: int = 10) -> list:
+        """Async :meth:`Type_5simProtocol.ban_many`"""
+        return await aeach(self.ban, ids, concurrency)
+
+    async def inbox(self, id: OrderId) -> dict:
+        """Async :meth:`Type_5simProtocol.inbox`"""
+        return (await self.session.get(
+            self.rpc + f"/user/sms/inbox/{id}",
+            )).json
+
+    def events(self, orders: list = None, interval: float = 2.0, **options) -> AsyncEventStream:
+        """Async :meth:`Type_5simProtocol.events`, use with `async for`"""
+        return AsyncEventStream(self, orders, interval, **options)
+
+    # < END Order managment >
+
+    # < Notifications >
+
+    async def notifications(self, lang: Lang = Lang.EN) -> dict:
+        """Async :meth:`Type_5simProtocol.notifications`"""
+        return (await self.session.get(
+            self.rpc + f"/guest/flash/{lang}",
+            )).json
+
+    # < END Notifications >
+
+    # < Vendors >
+
+    async def vendor(self) -> dict:
+        """Async :meth:`Type_5simProtocol.vendor`"""
+        return (await self.session.get(
+            self.rpc + f"/user/vendor",
+            )).json
+
+    async def vendor_wallets(self) -> dict:
+        """Async :meth:`Type_5simProtocol.vendor_wallets`"""
+        return (await self.session.get(
+            self.rpc + f"/vendor/wallets",
+            )).json
+
+    async def vendor_orders(self,
+        category: Category,
+        limit: Limit = None,
+        offset: Offset = None,
+        order: Order = None,
+        reverse: bool = None) -> dict:
+        """Async :meth:`Type_5simProtocol.vendor_orders`"""
+        params = {
+            "category": category,
+            "limit": limit,
+            "offset": offset,
+            "order": order,
+            "reverse": reverse
+        }
+
+        return (await self.session.get(
+            self.rpc + "/vendor/orders",
+            params = {k: v for k, v in params.items() if v is not None} # remove None items
+            )).json
+
+    async def vendor_payments(self,
+        limit: Limit = None,
+        offset: Offset = None,
+        order: Order = None,
+        reverse: bool = None) -> dict:
+        """Async :meth:`Type_5simProtocol.vendor_payments`"""
+        params = {
+            "limit": limit,
+            "offset": offset,
+            "order": order,
+            "reverse": reverse
+        }
+
+        return (await self.session.get(
+            self.rpc + "/vendor/payments",
+            params = {k: v for k, v in params.items() if v is not None} # remove None items
+            )).json
+
+    def iter_vendor_orders(self,
+        category: Category,
+        order: Order = None,
+        reverse: bool = None,
+        size: PageSize = None):
+        """Async :meth:`Type_5simProtocol.iter_vendor_orders`, use with `async for`"""
+        return aiter_pages(
+            lambda limit, offset: self.vendor_orders(category, limit, offset, order, reverse),
+            size)
+
+    def iter_vendor_payments(self,
+        order: Order = None,
+        reverse: bool = None,
+        size: PageSize = None):
+        """Async :meth:`Type_5simProtocol.iter_vendor_payments`, use with `async for`"""
+        return aiter_pages(
+            lambda limit, offset: self.vendor_payments(limit, offset, order, reverse),
+            size)
+
+    async def vendor_withdraw(self,
+        receiver: str,
+        method: str,
+        amount: int,
+        fee: str) -> dict:
+        """Async :meth:`Type_5simProtocol.vendor_withdraw`"""
+        data = {
+            "receiver": receiver,
+            "method": method,
+            "amount": amount,
+            "fee": fee
+        }
+
+        return (await self.session.post(
+            self.rpc + "/vendor/withdraw",
+            data = data
+            )).json
+
+    # < END Vendors >
+
+    # < Countries list >
+
+    async def countries(self) -> dict:
+        """Async :meth:`Type_5simProtocol.countries`"""
+        return (await self.session.get(
+            self.rpc + "/guest/countries",
+            )).json
+
+    def sync_catalog(self, path: str = "pysim_catalog.json", interval: float = 3600) -> AsyncCatalog:
+        """Async :meth:`Type_5simProtocol.sync_catalog`, refreshes in task of running loop"""
+        self.catalog = self.router.catalog = AsyncCatalog(self, path, interval).start()
+        return self.catalog
+
+    # < END Countries list >
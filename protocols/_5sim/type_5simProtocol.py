@@ -1,28 +1,78 @@
 from pysim.logger import log
 from req import Session
+from limiter import RateLimiter
+from cache import ResponseCache
+from metrics import Metrics
+from tracing import Tracer, traced
 from data import (
-    Service, URL, ApiKey, Category, 
+    URL, ApiKey, Category, 
     Limit, Offset, Order, Country, 
     Operator, Product, Number, OrderId,
     Lang
 )
 from _types import SimOrder
-
-class Type_5simProtocol(Service):
+from router import BuyRouter
+from batch import BatchResult, repeat, each
+from paginator import PageSize, iter_pages
+from pricebook import iter_stream_rows
+from db import OrderStore
+from type_defaultProtocol import Type_defaultProtocol
+from catalog import Catalog
+from events import EventStream
+
+@traced
+class Type_5simProtocol(Type_defaultProtocol):
     """
     Service: 5sim
     link: https://5sim.net/
     docs: https://docs.5sim.net
 
+    :limiter: (optional) :class:`RateLimiter` of session.\n
+    :cache: (optional) :class:`ResponseCache` for guest catalogs (prices, products, countries, notifications).\n
+    :pool_maxsize: Max keep-alive connections, raise it for concurrent batches.\n
+    :store: (optional) :class:`OrderStore` recording every returned order state.\n
+    :metrics: (optional) :class:`Metrics` of requests by endpoint.\n
+    :tracer: (optional) :class:`Tracer` with hooks around requests and methods of protocol.\n
     """
-    def __init__(self, key: ApiKey, rpc: URL = "https://5sim.net/v1"):
-        self.session = Session()
+    name = "5sim"
+    order_class = SimOrder
+    tracer = None
+
+    def __init__(self, 
+        key: ApiKey, 
+        rpc: URL = "https://5sim.net/v1", 
+        limiter: RateLimiter = None, 
+        cache: ResponseCache = None,
+        pool_maxsize: int = 10,
+        store: OrderStore = None,
+        metrics: Metrics = None,
+        tracer: Tracer = None):
+        self.session = Session(limiter=limiter, cache=cache, pool_maxsize=pool_maxsize, metrics=metrics, tracer=tracer)
         self.session.headers({
             "Authorization": f"Bearer {key}",
             "Accept": "application/json"
         })
 
         self.rpc = rpc
+        self.router = BuyRouter(self)
+        self.store = store
+        self.catalog = None
+        self.tracer = tracer
+
+    def _order(self, order: dict, into: SimOrder = None) -> SimOrder:
+        # wrap response to class SimOrder for easy interaction with order
+        if into is None:
+            SO = self.order_class(order).set_protocol(self)
+        else:
+            SO = into.update(order)
+
+        # sms arrival rate of pairs bought by buy_best
+        self.router.record(SO)
+
+        if self.store is not None:
+            self.store.record(SO)
+
+        return SO
     
     # < User >
 
@@ -116,6 +166,34 @@ class Type_5simProtocol(Service):
             params = {k: v for k, v in params.items() if v is not None} # remove None items
             ).json
 
+    def iter_orders(self, 
+        category: Category, 
+        order: Order = None, 
+        reverse: bool = None,
+        size: PageSize = None):
+        """Walks whole orders history lazily, page by page..
+        Yields :class:`dict` items of "Data" of :meth:`orders`, next page is prefetched while current one is consumed.\n
+
+        :category:  :class:`Category` can be 'Category.HOSTING' or 'Category.ACTIVATION'.\n
+        :order: (optional) Pagination :class:`Order`, should be field name.\n
+        :reverse: (optional) Is reversed history, true / false.\n
+        :size: (optional) Adaptive :class:`PageSize`.\n
+        """
+        return iter_pages(
+            lambda limit, offset: self.orders(category, limit, offset, order, reverse), 
+            size)
+
+    def iter_payments(self, 
+        order: Order = None, 
+        reverse: bool = None,
+        size: PageSize = None):
+        """Walks whole payments history lazily, page by page..
+        Same as :meth:`iter_orders` for :meth:`payments`.\n
+        """
+        return iter_pages(
+            lambda limit, offset: self.payments(limit, offset, order, reverse), 
+            size)
+
     # < END User >
 
     # < Products and prices >
@@ -164,6 +242,27 @@ class Type_5simProtocol(Service):
             params = {k:v for k, v in params.items() if v is not None} # remove None items
             ).json
 
+    def iter_prices(self, country: Country = None, product: Product = None, chunk_size: int = 65536):
+        """Streams :meth:`prices` without loading whole body..
+        Yields (country, product, operator, cost, count) rows while response is downloaded,
+        feed them to :meth:`PriceBook.from_rows` or :meth:`PriceBook.update_rows`.\n
+
+        :country: (optional) :class:`Country` name\n
+        :product: (optional) :class:`Product` name\n
+        :chunk_size: Size of read body chunks in bytes\n
+        """
+        params = {
+            'country': country,
+            'product': product
+        }
+        return iter_stream_rows(
+            self.session.stream(
+                self.rpc + f"/guest/prices",
+                chunk_size = chunk_size,
+                params = {k:v for k, v in params.items() if v is not None} # remove None items
+                ),
+            product_first = product is not None and country is None)
+
     # < END Products and prices >
 
     # < Purchase >
@@ -206,15 +305,10 @@ class Type_5simProtocol(Service):
             'ref': ref
         }
 
-        # wrap response to class SimOrder for easy interaction with order 
-        SO = SimOrder(self.session.get(
+        return self._order(self.session.get(
             self.rpc + f"/user/buy/activation/{country}/{operator}/{product}",
             params = {k:v for k, v in params.items() if v is not None} # remove None items
             ).json)
-
-        SO.set_protocol(self)
-
-        return SO
         
         
         
@@ -240,14 +334,10 @@ class Type_5simProtocol(Service):
         # GET - https://5sim.net/v1/user/buy/hosting/$country/$operator/$product
         # https://docs.5sim.net/#buy-hosting-number
 
-        SO = SimOrder(self.session.get(
+        return self._order(self.session.get(
             self.rpc + f"/user/buy/hosting/{country}/{operator}/{product}",
             ).json)
 
-        SO.set_protocol(self)
-
-        return SO
-
     def reuse(self, product: Product, number: Number) -> SimOrder:
         """Re-buy number..
         Returns :class:`SimOrder` object.\n
@@ -264,24 +354,68 @@ class Type_5simProtocol(Service):
         # GET - https://5sim.net/v1/user/reuse/$product/$number
         # https://docs.5sim.net/#re-buy-number
 
-        SO = SimOrder(self.session.get(
+        return self._order(self.session.get(
             self.rpc + f"/user/reuse/{product}/{number}",
             ).json)
 
-        SO.set_protocol(self)
+    def buy_best(self,
+        product: Product,
+        max_price: float = None,
+        countries: list = None,
+        attempts: int = 5,
+        **kwargs) -> SimOrder:
+        """Buy activation number in best (country, operator)..
+        Pairs are ranked by price, stock and observed SMS arrival rate, see :class:`BuyRouter`.\n
+        Returns :class:`SimOrder` object.\n
 
-        return SO
+        :product: :class:`Product` name\n
+        :max_price: (optional) Max cost of number\n
+        :countries: (optional) List of :class:`Country` to choose from\n
+        :attempts: Max count of tried (country, operator) pairs\n
+        :kwargs: (optional) forwarding, number, reuse, voice, ref of :meth:`buy`\n
+
+        :rtype: SimOrder\n
+        """
+        return self.router.buy_best(product, max_price, countries, attempts, **kwargs)
+
+    def buy_many(self,
+        product: Product,
+        n: int,
+        country: Country = Country.ANY, 
+        operator: Operator = Operator.ANY, 
+        concurrency: int = 10,
+        max_failures: int = None,
+        **kwargs) -> BatchResult:
+        """Buy :n: activation numbers concurrently..
+        Stops early once :n: numbers are bought, balance runs out or :max_failures: purchases failed.\n
+        Returns :class:`BatchResult` object.\n
+
+        :product: :class:`Product` name\n
+        :n: Count of numbers\n
+        :country: The :class:`Country`, "Country.ANY" - any country\n
+        :operator: The :class:`Operator`, "Operator.ANY" - any operator\n
+        :concurrency: Max purchases at once\n
+        :max_failures: (optional) Max failed purchases, default :n:\n
+        :kwargs: (optional) forwarding, number, reuse, voice, ref of :meth:`buy`\n
+
+        :rtype: BatchResult\n
+        :response example: BatchResult(orders=[SimOrder(...), ...], failures=[BatchFailure(attempt=3, error=NoFreePhonesError('No free phones'))], stopped=None)
+        """
+        return repeat(
+            lambda: self.buy(product, country, operator, **kwargs), 
+            n, concurrency, max_failures)
 
     # < END Purchase >
 
     # < Order managment >
 
-    def check(self, id: OrderId) -> SimOrder:
+    def check(self, id: OrderId, into: SimOrder = None) -> SimOrder:
         """Check order (Get SMS)..
         Returns :class:`SimOrder` object.\n
         Docs: https://docs.5sim.net/#check-order-get-sms\n
 
         :id: :class:`OrderId`\n
+        :into: (optional) :class:`SimOrder` updated in place instead of new one\n
 
         :rtype: SimOrder\n
         :response example: { "id": 11631253, "created_at": "2018-10-13T08:13:38.809469028Z", "phone": "+79000381454", "product": "vkontakte", "price": 21, "status": "RECEIVED", "expires": "2018-10-13T08:28:38.809469028Z", "sms": [ { "id":3027531, "created_at":"2018-10-13T08:20:38.809469028Z", "date":"2018-10-13T08:19:38Z", "sender":"VKcom", "text":"VK: 09363 - use this code to reclaim your suspended profile.", "code":"09363" } ], "forwarding": false, "forwarding_number": "", "country":"russia" }
@@ -291,20 +425,17 @@ class Type_5simProtocol(Service):
         # GET - https://5sim.net/v1/user/check/$id
         # https://docs.5sim.net/#check-order-get-sms
 
-        SO = SimOrder(self.session.get(
+        return self._order(self.session.get(
             self.rpc + f"/user/check/{id}",
-            ).json)
-
-        SO.set_protocol(self)
+            ).json, into)
 
-        return SO
-
-    def finish(self, id: OrderId) -> SimOrder:
+    def finish(self, id: OrderId, into: SimOrder = None) -> SimOrder:
         """Finish order..
         Returns :class:`SimOrder` object.\n
         Docs: https://docs.5sim.net/#finish-order\n
 
         :id: :class:`OrderId`\n
+        :into: (optional) :class:`SimOrder` updated in place instead of new one\n
 
         :rtype: SimOrder\n
         :response example: { "id": 11631253, "created_at": "2018-10-13T08:13:38.809469028Z", "phone": "+79000381454", "product": "vkontakte", "price": 21, "status": "FINISHED", "expires": "2018-10-13T08:28:38.809469028Z", "sms": [ { "id":3027531, "created_at":"2018-10-13T08:20:38.809469028Z", "date":"2018-10-13T08:19:38Z", "sender":"VKcom", "text":"VK: 09363 - use this code to reclaim your suspended profile.", "code":"09363" } ], "forwarding": false, "forwarding_number": "", "country":"russia" }
@@ -314,20 +445,17 @@ class Type_5simProtocol(Service):
         # GET - https://5sim.net/v1/user/finish/$id
         # https://docs.5sim.net/#finish-order
 
-        SO = SimOrder(self.session.get(
+        return self._order(self.session.get(
             self.rpc + f"/user/finish/{id}",
-            ).json)
+            ).json, into)
 
-        SO.set_protocol(self)
-
-        return SO
-
-    def cancel(self, id: OrderId) -> SimOrder:
+    def cancel(self, id: OrderId, into: SimOrder = None) -> SimOrder:
         """Cancel order..
         Returns :class:`SimOrder` object.\n
         Docs: https://docs.5sim.net/#cancel-order\n
 
         :id: :class:`OrderId`\n
+        :into: (optional) :class:`SimOrder` updated in place instead of new one\n
 
         :rtype: SimOrder\n
         :response example: { "id": 11631253, "created_at": "2018-10-13T08:13:38.809469028Z", "phone": "+79000381454", "product": "vkontakte", "price": 21, "status": "CANCELED", "expires": "2018-10-13T08:28:38.809469028Z", "sms": [ { "id":3027531, "created_at":"2018-10-13T08:20:38.809469028Z", "date":"2018-10-13T08:19:38Z", "sender":"VKcom", "text":"VK: 09363 - use this code to reclaim your suspended profile.", "code":"09363" } ], "forwarding": false, "forwarding_number": "", "country":"russia" }
@@ -337,20 +465,17 @@ class Type_5simProtocol(Service):
         # GET - https://5sim.net/v1/user/cancel/$id
         # https://docs.5sim.net/#cancel-order
 
-        SO = SimOrder(self.session.get(
+        return self._order(self.session.get(
             self.rpc + f"/user/cancel/{id}",
-            ).json)
-
-        SO.set_protocol(self)
+            ).json, into)
 
-        return SO
-
-    def ban(self, id: OrderId) -> dict:
+    def ban(self, id: OrderId, into: SimOrder = None) -> SimOrder:
         """Ban order..
         Returns :class:`SimOrder` object.\n
         Docs: https://docs.5sim.net/#ban-order\n
 
         :id: :class:`OrderId`\n
+        :into: (optional) :class:`SimOrder` updated in place instead of new one\n
 
         :rtype: SimOrder\n
         :response example: { "id": 11631253, "created_at": "2018-10-13T08:13:38.809469028Z", "phone": "+79000381454", "product": "vkontakte", "price": 21, "status": "BANNED", "expires": "2018-10-13T08:28:38.809469028Z", "sms": [ { "id":3027531, "created_at":"2018-10-13T08:20:38.809469028Z", "date":"2018-10-13T08:19:38Z", "sender":"VKcom", "text":"VK: 09363 - use this code to reclaim your suspended profile.", "code":"09363" } ], "forwarding": false, "forwarding_number": "", "country":"russia" }
@@ -360,13 +485,43 @@ class Type_5simProtocol(Service):
         # GET - https://5sim.net/v1/user/ban/$id
         # https://docs.5sim.net/#ban-order
 
-        SO = SimOrder(self.session.get(
+        return self._order(self.session.get(
             self.rpc + f"/user/ban/{id}",
-            ).json)
+            ).json, into)
 
-        SO.set_protocol(self)
+    def finish_many(self, ids: list, concurrency: int = 10) -> list:
+        """Finish many orders concurrently..
+        Returns list of :class:`OrderOutcome` in order of :ids:.\n
+        Order errors (not found, expired, no sms, hosting) are reported in outcome instead of raised.\n
 
-        return SO
+        :ids: List of :class:`OrderId` or :class:`SimOrder`\n
+        :concurrency: Max requests at once\n
+
+        :rtype: list\n
+        :response example: [OrderOutcome(id=11631253, order=SimOrder(...), error=None), OrderOutcome(id=11631254, order=None, error=OrderNotFoundError('Order not found'))]
+        """
+        return each(self.finish, ids, concurrency)
+
+    def cancel_many(self, ids: list, concurrency: int = 10) -> list:
+        """Cancel many orders concurrently..
+        Same as :meth:`finish_many` for :meth:`cancel`.\n
+        """
+        return each(self.cancel, ids, concurrency)
+
+    def ban_many(self, ids: list, concurrency: int = 10) -> list:
+        """Ban many orders concurrently..
+        Same as :meth:`finish_many` for :meth:`ban`.\n
+        """
+        return each(self.ban, ids, concurrency)
+
+    def open_orders(self) -> list:
+        """Orders that still may change (PENDING, RECEIVED) from :class:`OrderStore`..
+        Restores open orders after restart without requests to server.\n
+        Returns list of :class:`SimOrder`.\n
+
+        :rtype: list\n
+        """
+        return [self.order_class(order).set_protocol(self) for order in self.store.open_orders()]
 
     def inbox(self, id: OrderId) -> dict:
         """Get SMS inbox list by order's id..
@@ -387,6 +542,19 @@ class Type_5simProtocol(Service):
             self.rpc + f"/user/sms/inbox/{id}",
             ).json
 
+    def events(self, orders: list = None, interval: float = 2.0, **options) -> EventStream:
+        """Sms and status events of open orders..
+        Returns :class:`EventStream` object, iterate it to get :class:`OrderEvent`.
+        One :meth:`orders` history request covers many orders instead of :meth:`check` per order.\n
+
+        :orders: (optional) :class:`SimOrder` list to follow, None - all open orders of account.\n
+        :interval: Seconds between polls.\n
+        :options: (optional) category, page_size, horizon of :class:`EventStream`.\n
+
+        :usage: for event in protocol.events(orders): print(event.kind, event.order.id)
+        """
+        return EventStream(self, orders, interval, **options)
+
     # < END Order managment >
 
     # < Notifications >
@@ -517,6 +685,29 @@ class Type_5simProtocol(Service):
             params = {k: v for k, v in params.items() if v is not None} # remove None items
             ).json
 
+    def iter_vendor_orders(self,
+        category: Category, 
+        order: Order = None, 
+        reverse: bool = None,
+        size: PageSize = None):
+        """Walks whole vendor's orders history lazily, page by page..
+        Same as :meth:`iter_orders` for :meth:`vendor_orders`.\n
+        """
+        return iter_pages(
+            lambda limit, offset: self.vendor_orders(category, limit, offset, order, reverse), 
+            size)
+
+    def iter_vendor_payments(self,
+        order: Order = None, 
+        reverse: bool = None,
+        size: PageSize = None):
+        """Walks whole vendor's payments history lazily, page by page..
+        Same as :meth:`iter_orders` for :meth:`vendor_payments`.\n
+        """
+        return iter_pages(
+            lambda limit, offset: self.vendor_payments(limit, offset, order, reverse), 
+            size)
+
     def vendor_withdraw(self,
         receiver: str, 
         method: str, 
@@ -571,5 +762,17 @@ class Type_5simProtocol(Service):
             self.rpc + "/guest/countries",
             ).json
 
+    def sync_catalog(self, path: str = "pysim_catalog.json", interval: float = 3600) -> Catalog:
+        """Keep live catalog of countries, operators and products..
+        Returns :class:`Catalog` object.\n
+        Snapshot file is loaded at once and refreshed in background thread, new names are added to
+        :class:`Country`, :class:`Product`, :class:`Operator` and :attr:`router` skips pairs missing in catalog.\n
+
+        :path: (optional) Snapshot file, None - no snapshot.\n
+        :interval: Refresh period, in seconds.\n
+        """
+        self.catalog = self.router.catalog = Catalog(self, path, interval).start()
+        return self.catalog
+
     # < END Countries list >
 
@@ -0,0 +1,269 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pysim.logger import log
+from data import Status
+from exceptions import OrderNotFoundError
+from _types import SimOrder
+
+# statuses after which order never changes
+TERMINAL = frozenset((
+    Status.RECEIVED,
+    Status.CANCELED,
+    Status.TIMEOUT,
+    Status.FINISHED,
+    Status.BANNED
+))
+
+
+class _Watch:
+    """Watched order and its poll state"""
+    __slots__ = ("order", "callback", "created", "expires", "polls")
+
+    def __init__(self, order: SimOrder, callback=None):
+        self.order = order
+        self.callback = callback
+        self.created = order.created_ts
+        self.expires = order.expires_ts
+        self.polls = 0
+
+    def snapshot(self) -> tuple:
+        return self.order.status, len(self.order.sms or ())
+
+
+class _Watcher:
+    """Scheduling part shared by :class:`OrderWatcher` and :class:`AsyncOrderWatcher`"""
+    def __init__(self,
+        min_interval: float = 2.0,
+        max_interval: float = 30.0,
+        on_update = None):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.on_update = on_update
+
+        self.watches = {}   # order id -> _Watch
+        self.queue = []     # heap of (due, seq, order id)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.watches)
+
+    def __contains__(self, id):
+        return id in self.watches
+
+    def watch(self, order: SimOrder, callback = None) -> None:
+        """Start watching order..
+        :order: :class:`SimOrder` with protocol set.\n
+        :callback: (optional) Called with updated :class:`SimOrder` on every change.\n
+        """
+        if order.status in TERMINAL:
+            return
+
+        with self._lock:
+            scheduled = order.id in self.watches
+            self.watches[order.id] = _Watch(order, callback)
+            if not scheduled: # watched order keeps its heap entry, else it would be polled twice
+                heapq.heappush(self.queue, (time.time() + self.min_interval, next(self._seq), order.id))
+
+    def unwatch(self, id) -> None:
+        with self._lock:
+            self.watches.pop(id, None) # lazy deletion, heap entry is skipped later
+
+    def interval(self, watch: _Watch, now: float) -> float:
+        """Delay before next poll of order..
+        Grows linearly from :min_interval: right after purchase to :max_interval: at expiry,
+        without known lifetime grows by 1.5x per poll.
+        """
+        if watch.created and watch.expires and watch.expires > watch.created:
+            elapsed = (now - watch.created) / (watch.expires - watch.created)
+            interval = self.min_interval + (self.max_interval - self.min_interval) * min(max(elapsed, 0.0), 1.0)
+        else:
+            interval = min(self.min_interval * 1.5 ** watch.polls, self.max_interval)
+
+        if watch.expires and watch.expires > now:
+            # do not oversleep expiry, last poll should see TIMEOUT
+            interval = min(interval, watch.expires - now + self.min_interval)
+
+        return interval
+
+    def next_due(self) -> float:
+        """Time of next scheduled poll or None if nothing is watched"""
+        with self._lock:
+            while self.queue and self.queue[0][2] not in self.watches:
+                heapq.heappop(self.queue)
+
+            return self.queue[0][0] if self.queue else None
+
+    def _pop_due(self, now: float) -> list:
+        due = []
+        with self._lock:
+            while self.queue and self.queue[0][0] <= now:
+                _, _, id = heapq.heappop(self.queue)
+                watch = self.watches.get(id)
+                if watch is not None:
+                    due.append(watch)
+
+        return due
+
+    def _done(self, watch: _Watch, before: tuple, error: Exception = None) -> bool:
+        """Reschedule or drop polled order, returns True if order changed"""
+        order = watch.order
+        watch.polls += 1
+
+        if isinstance(error, OrderNotFoundError):
+            log.info(f"Order {order.id} not found, stop watching")
+            self.unwatch(order.id)
+            return False
+
+        if error is not None:
+            log.info(f"Order {order.id} check failed: {error!r}")
+
+        changed = error is None and watch.snapshot() != before
+
+        if order.status in TERMINAL:
+            self.unwatch(order.id)
+        else:
+            now = time.time()
+            with self._lock:
+                if order.id in self.watches:
+                    heapq.heappush(self.queue, (now + self.interval(watch, now), next(self._seq), order.id))
+
+        if changed:
+            if watch.callback is not None:
+                watch.callback(order)
+            if self.on_update is not None:
+                self.on_update(order)
+
+        return changed
+
+
+class OrderWatcher(_Watcher):
+    """Polls many live orders with per-order adaptive backoff..
+    Every order is polled fast right after purchase and slower as its expiry nears,
+    polling stops at terminal :class:`Status`.
+    Results are delivered to callbacks and by iterating over :meth:`updates`.\n
+
+    :min_interval: Delay between polls right after purchase, in seconds.\n
+    :max_interval: Delay between polls near expiry, in seconds.\n
+    :workers: Max concurrent check requests.\n
+    :on_update: (optional) Called with every changed :class:`SimOrder`.\n
+    """
+    def __init__(self,
+        min_interval: float = 2.0,
+        max_interval: float = 30.0,
+        workers: int = 16,
+        on_update = None):
+        super().__init__(min_interval, max_interval, on_update)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def _poll(self, watch: _Watch) -> bool:
+        before = watch.snapshot()
+        try:
+            watch.order.check() # updates order in place
+        except Exception as error:
+            return self._done(watch, before, error)
+
+        return self._done(watch, before)
+
+    def poll(self) -> list:
+        """Poll all due orders once, returns list of changed :class:`SimOrder`"""
+        due = self._pop_due(time.time())
+        changed = self.executor.map(self._poll, due)
+
+        return [watch.order for watch, is_changed in zip(due, changed) if is_changed]
+
+    def updates(self, timeout: float = None):
+        """Yields changed :class:`SimOrder` until all orders are done or :timeout: passed"""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            due = self.next_due()
+            if due is None:
+                return
+
+            now = time.time()
+            if deadline is not None and deadline <= due:
+                time.sleep(max(deadline - now, 0))
+                return
+
+            if due > now:
+                time.sleep(due - now)
+
+            yield from self.poll()
+
+    def __iter__(self):
+        return self.updates()
+
+    def run(self, timeout: float = None) -> None:
+        """Block until all orders are done or :timeout: passed, changes go to callbacks"""
+        for _ in self.updates(timeout):
+            pass
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=True)
+
+
+class AsyncOrderWatcher(_Watcher):
+    """Asyncio twin of :class:`OrderWatcher` for orders of :class:`AsyncType_5simProtocol`..
+
+    :min_interval: Delay between polls right after purchase, in seconds.\n
+    :max_interval: Delay between polls near expiry, in seconds.\n
+    :concurrency: Max concurrent check requests.\n
+    :on_update: (optional) Called with every changed :class:`AsyncSimOrder`.\n
+    """
+    def __init__(self,
+        min_interval: float = 2.0,
+        max_interval: float = 30.0,
+        concurrency: int = 256,
+        on_update = None):
+        super().__init__(min_interval, max_interval, on_update)
+        self.concurrency = concurrency
+
+    async def _poll(self, watch: _Watch, semaphore: asyncio.Semaphore) -> bool:
+        before = watch.snapshot()
+        async with semaphore:
+            try:
+                await watch.order.check() # updates order in place
+            except Exception as error:
+                return self._done(watch, before, error)
+
+        return self._done(watch, before)
+
+    async def poll(self) -> list:
+        """Poll all due orders once, returns list of changed :class:`AsyncSimOrder`"""
+        due = self._pop_due(time.time())
+        semaphore = asyncio.Semaphore(self.concurrency)
+        changed = await asyncio.gather(*(self._poll(watch, semaphore) for watch in due))
+
+        return [watch.order for watch, is_changed in zip(due, changed) if is_changed]
+
+    async def updates(self, timeout: float = None):
+        """Yields changed :class:`AsyncSimOrder` until all orders are done or :timeout: passed"""
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            due = self.next_due()
+            if due is None:
+                return
+
+            now = time.time()
+            if deadline is not None and deadline <= due:
+                await asyncio.sleep(max(deadline - now, 0))
+                return
+
+            if due > now:
+                await asyncio.sleep(due - now)
+
+            for order in await self.poll():
+                yield order
+
+    def __aiter__(self):
+        return self.updates()
+
+    async def run(self, timeout: float = None) -> None:
+        """Wait until all orders are done or :timeout: passed, changes go to callbacks"""
+        async for _ in self.updates(timeout):
+            pass
@@ -1,13 +1,103 @@
-import requests
-import json
+import time
+import asyncio
+import threading
+from importlib.util import find_spec
+from typing import TYPE_CHECKING
+from urllib.parse import urlencode
 
-from exceptions import BadCountryError, BadOperatorError, HostingOrderError, IncorrectCountryError, IncorrectProductError, NoProductError, NotEnoughRatingError, NotEnoughUserBalanceError, OrderNoSMSError, OrderNotFoundError, RecordNotFoundError, ReuseExpiredError, ReuseFalseError, ReuseNotPossibleError, SelectCountryError, SelectOperatorError, ServerOfflineError, UnauthorizedError, NoFreePhonesError
-from logger import log
+# requests and aiohttp are heavy to import, they are loaded by first Session / AsyncSession
+from exceptions import BadCountryError, BadOperatorError, HostingOrderError, IncorrectCountryError, IncorrectProductError, NoProductError, NotEnoughRatingError, NotEnoughUserBalanceError, OrderNoSMSError, OrderNotFoundError, OrderExpiredError, OrderHasSMSError, ReuseExpiredError, ReuseFalseError, ReuseNotPossibleError, SelectCountryError, SelectOperatorError, ServerOfflineError, UnauthorizedError, NoFreePhonesError, RequestLimitByApiKeyError, RequestLimitByIPError, RequestLimitBuyNumberError, HTTPStatusError
+from pysim.logger import log, body
+from limiter import RateLimiter
+from cache import ResponseCache, CacheEntry
+from metrics import Metrics, Timing
+from tracing import Tracer
 from data import URL, ReqType, ReqResponse, Errors
 
-class Session:
+if TYPE_CHECKING:
+    import aiohttp
+
+# statuses of rejected by rate limit requests
+LIMIT_STATUSES = (429, 503)
+
+# max size of successful response body that may still be error text ("no free phones")
+MAX_ERROR_SIZE = 256
+
+# (status, body) -> (exception, message), status None - any status
+ERRORS = {
+    (None, Errors.NO_FREE_PHONES): (NoFreePhonesError, "No free phones"),
+    (400, Errors.COUNTRY_IS_INCORRECT): (IncorrectCountryError, "Country is incorrect"),
+    (400, Errors.BAD_COUNTRY): (BadCountryError, "Bad country"),
+    (400, Errors.PRODUCT_IS_INCORRECT): (IncorrectProductError, "Product is incorrect"),
+    (400, Errors.BAD_OPERATOR): (BadOperatorError, "Bad operator"),
+    (400, Errors.NOT_ENOUGH_USER_BALANCE): (NotEnoughUserBalanceError, "Not enough user balance"),
+    (400, Errors.NOT_ENOUGH_RATING): (NotEnoughRatingError, "Not enough rating"),
+    (400, Errors.SELECT_COUNTRY): (SelectCountryError, "Select country"),
+    (400, Errors.SELECT_OPERATOR): (SelectOperatorError, "Select operator"),
+    (400, Errors.NO_PRODUCT): (NoProductError, "No product"),
+    (400, Errors.SERVER_OFFLINE): (ServerOfflineError, "Server is offline"),
+    (400, Errors.REUSE_NOT_POSSIBLE): (ReuseNotPossibleError, "Reuse not possible"),
+    (400, Errors.REUSE_FALSE_POSSIBLE): (ReuseFalseError, "Reuse false"),
+    (400, Errors.REUSE_EXPIRED): (ReuseExpiredError, "Reuse expired"),
+    (400, Errors.ORDER_NO_SMS): (OrderNoSMSError, "Order no sms"),
+    (400, Errors.ORDER_HAS_SMS): (OrderHasSMSError, "Order has sms"),
+    (400, Errors.ORDER_EXPIRED): (OrderExpiredError, "Order expired"),
+    (400, Errors.HOSTING_ORDER): (HostingOrderError, "Hosting order"),
+    (400, Errors.ORDER_NOT_FOUND): (OrderNotFoundError, "Order not found"),
+    (404, Errors.ORDER_NOT_FOUND): (OrderNotFoundError, "Order not found"),
+    # RECORD_NOT_FOUND is the same html page as ERROR_404
+    (404, Errors.ERROR_404): (OrderNotFoundError, "Order not found"),
+}
+
+# url parts of GET endpoints that change state, their identical calls are never coalesced
+NOT_IDEMPOTENT = ("/user/buy/", "/user/reuse/", "/user/finish/", "/user/cancel/", "/user/ban/", "/vendor/withdraw")
+
+
+class Flight:
+    """Running request shared by identical calls of :meth:`Session.send`"""
+    __slots__ = ("done", "response", "error")
+
     def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class Session:
+    """Session for requests to sms-server..
+    :limiter: (optional) :class:`RateLimiter`, by default limits with 5sim-friendly rates.\n
+    :cache: (optional) :class:`ResponseCache` for GET responses, None - no caching.\n
+    :pool_maxsize: Max keep-alive connections to one host, should cover concurrent threads.\n
+    :metrics: (optional) :class:`Metrics` recording latency, statuses and errors by endpoint.\n
+    :tracer: (optional) :class:`Tracer` with hooks around every request.\n
+    :coalesce: Identical idempotent GETs running at once share one request and its response.\n
+    """
+    def __init__(self,
+        limiter: RateLimiter = None,
+        cache: ResponseCache = None,
+        pool_maxsize: int = 10,
+        metrics: Metrics = None,
+        tracer: Tracer = None,
+        coalesce: bool = True):
+        import requests
+
         self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.limiter = limiter or RateLimiter()
+        self.cache = cache
+        self.metrics = metrics
+        self.tracer = tracer
+        self.coalesce = coalesce
+
+        self.flights = {} # flight key -> Flight
+        self._flights_lock = threading.Lock()
+
+    @property
+    def key(self) -> str:
+        """Authorization of session, used to choose rate limit bucket"""
+        return self.session.headers.get("Authorization")
 
     def headers(self, *args, **kwargs):
         self.session.headers.update(*args, **kwargs)
@@ -15,60 +105,78 @@ class Session:
     def cookies(self, *args, **kwargs):
         self.session.cookies.update(*args, **kwargs)
 
-    def capture_errors(self, r: requests.Request) -> None:
-        if r.text == Errors.NO_FREE_PHONES:
-            raise NoFreePhonesError("No free phones")
+    def capture_errors(self, response: ReqResponse) -> None:
+        # error bodies are short, do not decode big payloads only to compare them
+        if response.status_code >= 400 or len(response.content) <= MAX_ERROR_SIZE:
+            self.capture(response.status_code, response.text)
+
+    def capture_limits(self, url: URL, status_code: int) -> None:
+        """Raise request limit exception for 429 / 503 left after retries"""
+        if status_code == 429:
+            raise RequestLimitByApiKeyError("Status Code: 429 Request limit by api key")
 
-        if r.status_code == 401:
+        if status_code == 503:
+            if self.limiter.is_buy(url):
+                raise RequestLimitBuyNumberError("Status Code: 503 Request limit of buying numbers")
+            raise RequestLimitByIPError("Status Code: 503 Request limit by ip")
+
+    def capture(self, status_code: int, text: str) -> None:
+        """Raise mapped exception for response status and body"""
+        error = ERRORS.get((status_code, text)) or ERRORS.get((None, text))
+        if error is not None:
+            exception, message = error
+            raise exception(message)
+
+        if status_code == 401:
             raise UnauthorizedError("Status Code: 401 Unauthorized")
 
-        if r.status_code == 400:
-            if r.text == Errors.COUNTRY_IS_INCORRECT:
-                raise IncorrectCountryError("Country is incorrect")
-            elif r.text == Errors.BAD_COUNTRY:
-                raise BadCountryError("Bad country")
-            elif r.text == Errors.PRODUCT_IS_INCORRECT:
-                raise IncorrectProductError("Product is incorrect")
-            elif r.text == Errors.BAD_OPERATOR:
-                raise BadOperatorError("Bad operator")
-            elif r.text == Errors.NOT_ENOUGH_USER_BALANCE:
-                raise NotEnoughUserBalanceError("Not enough user balance")
-            elif r.text == Errors.NOT_ENOUGH_RATING:
-                raise NotEnoughRatingError("Not enough user balance")
-            elif r.text == Errors.SELECT_COUNTRY:
-                raise SelectCountryError("Select country")
-            elif r.text == Errors.SELECT_OPERATOR:
-                raise SelectOperatorError("Select operator")
-            elif r.text == Errors.NO_PRODUCT:
-                raise NoProductError("No product")
-            elif r.text == Errors.SERVER_OFFLINE:
-                raise ServerOfflineError("Server is offline")
-            elif r.text == Errors.NO_FREE_PHONES:
-                raise NoFreePhonesError("No free phones")
-            elif r.text == Errors.REUSE_NOT_POSSIBLE:
-                raise ReuseNotPossibleError("Reuse not possible")
-            elif r.text == Errors.REUSE_FALSE_POSSIBLE:
-                raise ReuseFalseError("Reuse false")
-            elif r.text == Errors.REUSE_EXPIRED:
-                raise ReuseExpiredError("Reuse expired")
-            elif r.text == Errors.ORDER_NO_SMS:
-                raise OrderNoSMSError("Order no sms")
-            elif r.text == Errors.HOSTING_ORDER:
-                raise HostingOrderError("Hosting order")
-            elif r.text == Errors.ORDER_NOT_FOUND:
-                raise OrderNotFoundError("Order not found")
-            else:
-                log.info(f"Uncaptured 400 Error: {r.text}")
-
-        if r.status_code == 404:
-            if r.text == Errors.ORDER_NOT_FOUND or r.text == Errors.ERROR_404:
-                raise OrderNotFoundError("Order not found")
-            elif r.text == Errors.RECORD_NOT_FOUND:
-                raise RecordNotFoundError("Order not found")
-            else:
-                log.info(f"Uncaptured 404 Error: {r.text}")
+        if status_code in (400, 404):
+            log.info(f"Uncaptured {status_code} Error: {text}")
 
-        
+        if status_code >= 500:
+            raise HTTPStatusError(f"Status Code: {status_code}")
+
+    def capture_response(self, _type: ReqType, url: URL, response: ReqResponse, strict: bool = False) -> None:
+        """Raise exception of limit or error response, counted by :metrics:..
+        :strict: Raise :class:`HTTPStatusError` for any other status than 200 too.\n
+        """
+        try:
+            self.capture_limits(url, response.status_code)
+            self.capture_errors(response)
+            if strict and response.status_code != 200:
+                raise HTTPStatusError(f"Status Code: {response.status_code}")
+        except Exception as error:
+            if self.metrics is not None:
+                self.metrics.error(_type, url, error)
+            raise
+
+    def flight_key(self, url: URL, _type: ReqType, kwargs: dict) -> str:
+        """Key of coalesced request, None if request is not coalesced"""
+        if not self.coalesce or _type != ReqType.GET or kwargs.keys() - {"params"}:
+            return None
+        if any(part in url for part in NOT_IDEMPOTENT):
+            return None
+
+        params = kwargs.get("params")
+        return url + "?" + urlencode(sorted((k, str(v)) for k, v in params.items())) if params else url
+
+    def cached(self, url: URL, _type: ReqType, kwargs: dict) -> tuple:
+        """Returns (key, entry, ttl) of cacheable request..
+        Adds validators of stale entry to request headers.
+        """
+        if self.cache is None or _type != ReqType.GET:
+            return None, None, 0
+
+        ttl = self.cache.ttl(url)
+        if not ttl:
+            return None, None, 0
+
+        key = self.cache.key(url, kwargs.get("params"))
+        entry = self.cache.get(key)
+        if entry is not None and not entry.fresh():
+            kwargs["headers"] = {**kwargs.get("headers", {}), **entry.validators()}
+
+        return key, entry, ttl
 
     # < main function for requests >
     def send(self,
@@ -76,15 +184,136 @@ class Session:
         _type: ReqType = ReqType.GET,
          **kwargs):
 
-        r = self.session.request(_type, url, **kwargs)
-        log.debug(f"New Request | {_type} - {url}, kwargs={kwargs} | Response<{r.status_code}>: {r.text}")
+        key = self.flight_key(url, _type, kwargs)
+        if key is None:
+            return self._traced(url, _type, **kwargs)
+
+        with self._flights_lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
 
-        self.capture_errors(r)
+        if not leader: # same request is running, wait for its response
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.response.copy()
 
-        return ReqResponse(req=r, json=r.json(), text=r.text, content=r.content)
+        try:
+            flight.response = self._traced(url, _type, **kwargs)
+        except BaseException as error:
+            flight.error = error
+            raise
+        finally:
+            with self._flights_lock:
+                del self.flights[key]
+            flight.done.set()
+
+        return flight.response
+
+    def _traced(self,
+        url: URL, 
+        _type: ReqType = ReqType.GET,
+         **kwargs):
+
+        if self.tracer is None:
+            return self._send(url, _type, **kwargs)
+
+        span = self.tracer.start("request", _type, url)
+        try:
+            response = self._send(url, _type, **kwargs)
+        except Exception as error:
+            self.tracer.finish(span, error=error)
+            raise
+
+        self.tracer.finish(span, response.status_code)
+        return response
+
+    def _send(self,
+        url: URL, 
+        _type: ReqType = ReqType.GET,
+         **kwargs):
+
+        key, entry, ttl = self.cached(url, _type, kwargs)
+        if entry is not None and entry.fresh():
+            return entry.response.copy()
+
+        attempt = 0
+        while True:
+            delay = self.limiter.acquire(url, self.key)
+            if delay:
+                time.sleep(delay)
+
+            started = time.perf_counter()
+            r = self.session.request(_type, url, **kwargs)
+            # keep only body and headers, not whole requests.Response
+            response = ReqResponse(r.status_code, r.headers, r.content, r.encoding)
+            if self.metrics is not None:
+                self.metrics.observe(_type, url, response.status_code, time.perf_counter() - started,
+                    bytes_in = len(response.content),
+                    bytes_out = len(r.request.body or b""),
+                    first_byte = r.elapsed.total_seconds())
+            del r
+            # message is built only if some sink takes DEBUG
+            log.opt(lazy=True).debug("{}", lambda: f"New Request | {_type} - {url}, kwargs={kwargs} | Response<{response.status_code}>: {body(response.content)}")
+
+            if response.status_code not in LIMIT_STATUSES or attempt >= self.limiter.retries:
+                break
+
+            if self.metrics is not None:
+                self.metrics.retry(_type, url)
+            time.sleep(self.limiter.retry_delay(url, self.key, attempt, response.headers.get("Retry-After")))
+            attempt += 1
+
+        if entry is not None and response.status_code == 304:
+            entry.refresh(ttl)
+            return entry.response.copy()
+
+        self.capture_response(_type, url, response)
+
+        if key is not None and response.status_code == 200:
+            self.cache.set(key, CacheEntry(response.copy(), ttl, response.headers.get("ETag"), response.headers.get("Last-Modified"), len(response.content)))
+
+        return response
 
     # < END >
 
+    def stream(self,
+        url: URL,
+        chunk_size: int = 65536,
+         **kwargs):
+        """Yields body of GET response by chunks of bytes as they arrive..
+        Limits and errors are handled like in :meth:`send`, response is not cached.
+        """
+        attempt = 0
+        while True:
+            delay = self.limiter.acquire(url, self.key)
+            if delay:
+                time.sleep(delay)
+
+            started = time.perf_counter()
+            r = self.session.request(ReqType.GET, url, stream=True, **kwargs)
+            if self.metrics is not None:
+                self.metrics.observe(ReqType.GET, url, r.status_code, first_byte=time.perf_counter() - started)
+            log.opt(lazy=True).debug("{}", lambda: f"New Stream | {ReqType.GET} - {url}, kwargs={kwargs} | Response<{r.status_code}>")
+
+            if r.status_code not in LIMIT_STATUSES or attempt >= self.limiter.retries:
+                break
+
+            r.close()
+            if self.metrics is not None:
+                self.metrics.retry(ReqType.GET, url)
+            time.sleep(self.limiter.retry_delay(url, self.key, attempt, r.headers.get("Retry-After")))
+            attempt += 1
+
+        with r:
+            if r.status_code != 200:
+                # body of error must not go to row parser
+                self.capture_response(ReqType.GET, url, ReqResponse(r.status_code, r.headers, r.content, r.encoding), strict=True)
+
+            yield from r.iter_content(chunk_size)
+
     def post(self,
         url: URL, 
         _type: ReqType = ReqType.POST,
@@ -111,4 +340,232 @@ class Session:
         _type: ReqType = ReqType.OPTIONS,
          **kwargs):
         
-        return self.send(url, _type, **kwargs)
\ No newline at end of file
+        return self.send(url, _type, **kwargs)
+
+class AsyncSession(Session):
+    """Asyncio twin of :class:`Session`..
+    All requests share one keep-alive connection pool.\n
+
+    :limit: Max connections in the pool, 0 - unlimited.\n
+    :limit_per_host: Max connections to one host, 0 - unlimited.\n
+    :timeout: (optional) Total timeout of one request in seconds.\n
+    :limiter: (optional) :class:`RateLimiter`, by default limits with 5sim-friendly rates.\n
+    :cache: (optional) :class:`ResponseCache` for GET responses, None - no caching.\n
+    :metrics: (optional) :class:`Metrics`, dns and connect phases are traced too.\n
+    :tracer: (optional) :class:`Tracer` with hooks around every request.\n
+    :coalesce: Identical idempotent GETs running at once share one request and its response.\n
+    """
+    def __init__(self, 
+        limit: int = 100, 
+        limit_per_host: int = 0, 
+        timeout: float = None, 
+        limiter: RateLimiter = None,
+        cache: ResponseCache = None,
+        metrics: Metrics = None,
+        tracer: Tracer = None,
+        coalesce: bool = True):
+        if find_spec("aiohttp") is None: # optional, required only by AsyncSession
+            raise ImportError("AsyncSession requires aiohttp: pip install aiohttp")
+
+        self.limiter = limiter or RateLimiter()
+        self.cache = cache
+        self.metrics = metrics
+        self.tracer = tracer
+        self.coalesce = coalesce
+        self.flights = {} # flight key -> asyncio.Future of response
+
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+
+        self._headers = {}
+        self._cookies = {}
+        self.session = None # created on first request, inside running loop
+
+    @property
+    def key(self) -> str:
+        return self._headers.get("Authorization")
+
+    def headers(self, *args, **kwargs):
+        self._headers.update(*args, **kwargs)
+        if self.session is not None:
+            self.session.headers.update(*args, **kwargs)
+
+    def cookies(self, *args, **kwargs):
+        self._cookies.update(*args, **kwargs)
+        if self.session is not None:
+            self.session.cookie_jar.update_cookies(dict(*args, **kwargs))
+
+    def connect(self) -> "aiohttp.ClientSession":
+        """Returns shared :class:`aiohttp.ClientSession`, creates it on first call"""
+        if self.session is None or self.session.closed:
+            import aiohttp
+
+            self.session = aiohttp.ClientSession(
+                connector = aiohttp.TCPConnector(
+                    limit = self.limit,
+                    limit_per_host = self.limit_per_host,
+                    ttl_dns_cache = 300),
+                timeout = aiohttp.ClientTimeout(total=self.timeout),
+                headers = self._headers,
+                cookies = self._cookies,
+                trace_configs = [self.metrics.trace_config()] if self.metrics is not None else None)
+
+        return self.session
+
+    @staticmethod
+    def query(kwargs: dict) -> None:
+        if kwargs.get("params"):
+            # aiohttp accepts only str, int and float query values
+            kwargs["params"] = {k: v if isinstance(v, (str, int, float)) and not isinstance(v, bool) else str(v) 
+                for k, v in kwargs["params"].items()}
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # < main function for requests >
+    async def send(self,
+        url: URL, 
+        _type: ReqType = ReqType.GET,
+         **kwargs):
+
+        key = self.flight_key(url, _type, kwargs)
+        if key is None:
+            return await self._traced(url, _type, **kwargs)
+
+        flight = self.flights.get(key)
+        if flight is not None: # same request is running, wait for its response
+            try:
+                return (await asyncio.shield(flight)).copy()
+            except asyncio.CancelledError:
+                if not flight.cancelled(): # this call is cancelled
+                    raise
+            # first call was cancelled, send own request
+
+        flight = self.flights[key] = asyncio.get_running_loop().create_future()
+        try:
+            response = await self._traced(url, _type, **kwargs)
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except BaseException as error:
+            flight.set_exception(error)
+            flight.exception() # retrieved, no warning if nobody waits
+            raise
+        else:
+            flight.set_result(response)
+        finally:
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+
+        return response
+
+    async def _traced(self,
+        url: URL, 
+        _type: ReqType = ReqType.GET,
+         **kwargs):
+
+        if self.tracer is None:
+            return await self._send(url, _type, **kwargs)
+
+        span = self.tracer.start("request", _type, url)
+        try:
+            response = await self._send(url, _type, **kwargs)
+        except Exception as error:
+            self.tracer.finish(span, error=error)
+            raise
+
+        self.tracer.finish(span, response.status_code)
+        return response
+
+    async def _send(self,
+        url: URL, 
+        _type: ReqType = ReqType.GET,
+         **kwargs):
+
+        self.query(kwargs)
+
+        key, entry, ttl = self.cached(url, _type, kwargs)
+        if entry is not None and entry.fresh():
+            return entry.response.copy()
+
+        attempt = 0
+        while True:
+            delay = self.limiter.acquire(url, self.key)
+            if delay:
+                await asyncio.sleep(delay)
+
+            timing = Timing() if self.metrics is not None else None
+            async with self.connect().request(_type, url, trace_request_ctx=timing, **kwargs) as r:
+                response = ReqResponse(r.status, r.headers, await r.read(), r.charset)
+            if timing is not None:
+                self.metrics.observe(_type, url, response.status_code, time.perf_counter() - timing.started,
+                    timing = timing,
+                    bytes_in = len(response.content))
+
+            # message is built only if some sink takes DEBUG
+            log.opt(lazy=True).debug("{}", lambda: f"New Request | {_type} - {url}, kwargs={kwargs} | Response<{response.status_code}>: {body(response.content)}")
+
+            if response.status_code not in LIMIT_STATUSES or attempt >= self.limiter.retries:
+                break
+
+            if self.metrics is not None:
+                self.metrics.retry(_type, url)
+            await asyncio.sleep(self.limiter.retry_delay(url, self.key, attempt, response.headers.get("Retry-After")))
+            attempt += 1
+
+        if entry is not None and response.status_code == 304:
+            entry.refresh(ttl)
+            return entry.response.copy()
+
+        self.capture_response(_type, url, response)
+
+        if key is not None and response.status_code == 200:
+            self.cache.set(key, CacheEntry(response.copy(), ttl, response.headers.get("ETag"), response.headers.get("Last-Modified"), len(response.content)))
+
+        return response
+
+    # < END >
+
+    async def stream(self,
+        url: URL,
+        chunk_size: int = 65536,
+         **kwargs):
+        """Async :meth:`Session.stream`, use with `async for`"""
+        self.query(kwargs)
+
+        attempt = 0
+        while True:
+            delay = self.limiter.acquire(url, self.key)
+            if delay:
+                await asyncio.sleep(delay)
+
+            timing = Timing() if self.metrics is not None else None
+            r = await self.connect().request(ReqType.GET, url, trace_request_ctx=timing, **kwargs)
+            if timing is not None:
+                self.metrics.observe(ReqType.GET, url, r.status, timing=timing)
+            log.opt(lazy=True).debug("{}", lambda: f"New Stream | {ReqType.GET} - {url}, kwargs={kwargs} | Response<{r.status}>")
+
+            if r.status not in LIMIT_STATUSES or attempt >= self.limiter.retries:
+                break
+
+            r.release()
+            if self.metrics is not None:
+                self.metrics.retry(ReqType.GET, url)
+            await asyncio.sleep(self.limiter.retry_delay(url, self.key, attempt, r.headers.get("Retry-After")))
+            attempt += 1
+
+        async with r:
+            if r.status != 200:
+                self.capture_response(ReqType.GET, url, ReqResponse(r.status, r.headers, await r.read(), r.charset), strict=True)
+
+            async for chunk in r.content.iter_chunked(chunk_size):
+                yield chunk
@@ -0,0 +1,365 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from pysim import logger
+import type_defaultProtocol
+from limiter import TokenBucket, RateLimiter
+from cache import ResponseCache, CacheEntry
+from metrics import Metrics, endpoint
+from req import Session, ERRORS
+from db import OrderStore
+from _types import SimOrder, AsyncSimOrder
+from data import ReqResponse, Errors
+from dispatcher import Dispatcher, AsyncDispatcher
+from exceptions import RequestLimitByApiKeyError, RequestLimitBuyNumberError, NoFreePhonesError, ServerOfflineError, OrderNotFoundError, OrderHasSMSError, HTTPStatusError
+
+
+def serve(responses: list) -> ThreadingHTTPServer:
+    """Local server answering GET requests with :responses: [(status, body[, headers]), ...] in turn, last one repeats"""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            self.server.paths.append(self.path)
+            self.server.headers.append(self.headers)
+            status, body, *headers = responses[min(len(self.server.paths), len(responses)) - 1]
+            body = (body if isinstance(body, str) else json.dumps(body)).encode()
+
+            self.send_response(status)
+            for name, value in (headers[0] if headers else {}).items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.paths = []
+    server.headers = []
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, capacity=2)
+
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert 0.09 < bucket.reserve() <= 0.1 # third token is borrowed from the future
+    assert 0.19 < bucket.reserve() <= 0.2
+
+def test_rate_limiter_buckets():
+    limiter = RateLimiter(per_key=10, per_ip=100, buy=1)
+
+    assert len(limiter.buckets("/v1/user/check/1", "key1")) == 2
+    assert len(limiter.buckets("/v1/user/buy/activation/any/any/tinder", "key1")) == 3
+    assert limiter.key_bucket("key1") is limiter.key_bucket("key1")
+    assert limiter.key_bucket("key1") is not limiter.key_bucket("key2")
+
+    assert limiter.acquire("/v1/user/buy/activation/any/any/tinder") == 0
+    assert limiter.acquire("/v1/user/buy/activation/any/any/tinder") > 0.9
+
+def test_session_retries_limits():
+    server = serve([(429, ""), (503, ""), (200, {"balance": 100})])
+    session = Session(limiter=RateLimiter(backoff=0.01))
+
+    assert session.get(server.url + "/v1/user/profile").json == {"balance": 100}
+    assert len(server.paths) == 3
+
+    server.shutdown()
+
+def test_session_raises_limits():
+    server = serve([(429, "")])
+    session = Session(limiter=RateLimiter(retries=1, backoff=0.01))
+    try:
+        session.get(server.url + "/v1/user/profile")
+    except Exception as error:
+        assert RequestLimitByApiKeyError == type(error)
+    assert len(server.paths) == 2
+
+    server.shutdown()
+
+    server = serve([(503, "")])
+    session = Session(limiter=RateLimiter(retries=0))
+    try:
+        session.get(server.url + "/v1/user/buy/activation/any/any/tinder")
+    except Exception as error:
+        assert RequestLimitBuyNumberError == type(error)
+
+    server.shutdown()
+
+def test_response_is_lazy():
+    profile = {"balance": 100, "email": "x" * 300}
+    server = serve([(200, profile), (200, "no free phones")])
+    session = Session()
+
+    response = session.get(server.url + "/v1/user/profile")
+    assert ReqResponse == type(response)
+    assert response._text is None and response._json is None
+    assert response.json == profile and response.json is response.json
+    assert response._text is None # big utf-8 body is parsed from bytes, never decoded
+
+    try:
+        session.get(server.url + "/v1/user/buy/activation/any/any/tinder")
+    except Exception as error:
+        assert NoFreePhonesError == type(error)
+
+    server.shutdown()
+
+def test_capture_errors():
+    # every error text of server has its exception
+    assert {text for _, text in ERRORS} == set(Errors)
+
+    session = Session()
+    for status, text, exception in [
+        (200, Errors.NO_FREE_PHONES, NoFreePhonesError),
+        (400, Errors.ORDER_HAS_SMS, OrderHasSMSError),
+        (404, Errors.RECORD_NOT_FOUND, OrderNotFoundError)]:
+        try:
+            session.capture_errors(ReqResponse(status, {}, text.encode()))
+        except Exception as error:
+            assert exception == type(error)
+        else:
+            assert False, text
+
+    session.capture_errors(ReqResponse(200, {}, b'{"balance": 100}')) # not an error
+
+def test_metrics():
+    assert endpoint("https://5sim.net/v1/user/check/123") == "/user/check/{id}"
+    assert endpoint("https://5sim.net/v1/user/orders?category=activation") == "/user/orders"
+    assert endpoint("http://127.0.0.1:80/v1/vendor/orders/42") == "/vendor/orders/{id}"
+
+    server = serve([(429, ""), (200, "no free phones")])
+    metrics = Metrics()
+    session = Session(limiter=RateLimiter(backoff=0.01), metrics=metrics)
+
+    try:
+        session.get(server.url + "/v1/user/buy/activation/any/any/tinder")
+    except Exception as error:
+        assert NoFreePhonesError == type(error)
+
+    stats = metrics.snapshot()["GET /user/buy/activation/{country}/{operator}/{product}"]
+    assert stats["statuses"] == {429: 1, 200: 1} and stats["retries"] == 1
+    assert stats["errors"] == {"NoFreePhonesError": 1}
+    assert stats["bytes_in"] == len("no free phones")
+    assert stats["latency"]["total"]["count"] == 2
+
+    text = metrics.prometheus()
+    assert 'pysim_responses_total{method="GET",endpoint="/user/buy/activation/{country}/{operator}/{product}",status="429"} 1' in text
+    assert 'phase="total",le="+Inf"} 2' in text
+
+    server.shutdown()
+
+def test_session_stream():
+    body = json.dumps({"russia": {"tinder": {"mts": {"cost": 3, "count": 10}}}})
+    server = serve([(429, ""), (200, body)])
+    session = Session(limiter=RateLimiter(backoff=0.01))
+
+    assert b"".join(session.stream(server.url + "/v1/guest/prices", chunk_size=4)) == body.encode()
+    assert len(server.paths) == 2
+
+    server.shutdown()
+
+    server = serve([(502, "<html>bad gateway</html>"), (500, "")])
+    for _ in range(2):
+        try:
+            list(session.stream(server.url + "/v1/guest/prices"))
+        except Exception as error:
+            assert HTTPStatusError == type(error)
+    assert len(server.paths) == 2
+
+    server.shutdown()
+
+def test_log_body():
+    logger.setup(path=None, stdout=False, body_size=4)
+    assert logger.body(b"abc") == "abc"
+    assert logger.body(b'{"balance": 100}') == '{"ba... (+12 bytes)'
+    logger.setup(path=None, stdout=False)
+
+def test_log_setup_default_handler():
+    logger.setup(path=None, stdout=False, level="INFO")
+
+    called = []
+    logger.log.opt(lazy=True).debug("{}", lambda: called.append(1))
+    assert not called # default DEBUG handler is removed
+    logger.setup(path=None, stdout=False)
+
+def test_response_cache_lru():
+    cache = ResponseCache(max_entries=2, max_bytes=100)
+    cache.set("a", CacheEntry("a", ttl=60, size=10))
+    cache.set("b", CacheEntry("b", ttl=60, size=10))
+    cache.get("a")
+    cache.set("c", CacheEntry("c", ttl=60, size=10))
+
+    assert list(cache.entries) == ["a", "c"] # "b" was least recently used
+
+    cache.set("d", CacheEntry("d", ttl=60, size=95))
+    assert list(cache.entries) == ["d"] and cache.size == 95
+
+    assert cache.key("/guest/prices", {"product": "tinder", "country": "russia"}) == "/guest/prices?country=russia&product=tinder"
+    assert cache.ttl("https://5sim.net/v1/guest/prices") == 60
+    assert cache.ttl("https://5sim.net/v1/user/check/1") == 0
+
+def test_session_cache_revalidation():
+    server = serve([(200, {"russia": {}}, {"ETag": '"v1"'}), (304, "")])
+    session = Session(cache=ResponseCache(ttls={"/guest/prices": 0.1}))
+
+    first = session.get(server.url + "/v1/guest/prices", params={"country": "russia"})
+    first.json["russia"]["changed"] = True # caller owns its response, cached one is not changed
+    assert session.get(server.url + "/v1/guest/prices", params={"country": "russia"}).json == {"russia": {}}
+    assert len(server.paths) == 1
+
+    time.sleep(0.15)
+    assert session.get(server.url + "/v1/guest/prices", params={"country": "russia"}).json == {"russia": {}}
+    assert len(server.paths) == 2
+    assert server.headers[1]["If-None-Match"] == '"v1"'
+
+    server.shutdown()
+
+def test_order_store():
+    path = os.path.join(tempfile.mkdtemp(), "orders.db")
+    store = OrderStore(path, interval=0.01)
+
+    order = SimOrder({"id": 1, "phone": "+79000381454", "product": "vkontakte", "price": 21, "status": "PENDING", "sms": [], "created_at": "2018-10-13T08:13:38.809469028Z", "country": "russia"})
+    store.record(order)
+    store.record(SimOrder({"id": 2, "phone": "+79000381455", "status": "CANCELED", "sms": []}))
+
+    order.update({"status": "RECEIVED", "sms": [{"id": 3027531, "created_at": "2018-10-13T08:20:38.809469028Z", "sender": "VKcom", "text": "VK: 09363", "code": "09363"}]})
+    store.record(order)
+    store.record(order)
+    store.flush()
+
+    assert [order["id"] for order in store.open_orders()] == [1]
+    assert store.codes("+79000381454") == ["09363"]
+    assert [status for status, _ in store.transitions(1)] == ["PENDING", "RECEIVED"]
+    assert store.order(1)["sms"][0]["code"] == "09363"
+
+    store.close()
+
+    store = OrderStore(path, interval=0.01) # reopened after restart
+    assert [order["id"] for order in store.open_orders()] == [1]
+
+    # sms without id, bad row in batch and status written before restart
+    order.update({"sms": order.sms + [{"created_at": "2018-10-13T08:21:38.809469028Z", "text": "VK: 11111", "code": "11111"}]})
+    store.record(order)
+    store.record(SimOrder({"id": 3, "phone": "+79000381456", "price": {"bad": 1}, "status": "PENDING", "sms": []}))
+    store.record(SimOrder({"id": 4, "phone": "+79000381457", "status": "PENDING", "sms": []}))
+    store.flush()
+
+    assert store.codes("+79000381454") == ["09363", "11111"]
+    assert [status for status, _ in store.transitions(1)] == ["PENDING", "RECEIVED"]
+    assert store.order(3) is None
+    assert store.order(4)["status"] == "PENDING"
+    store.close()
+
+def test_protocol_registry():
+    class Fake(type_defaultProtocol.Type_defaultProtocol):
+        name = "fake"
+        def __init__(self, key):
+            self.key = key
+
+    type_defaultProtocol.register("fake", Fake)
+    assert type_defaultProtocol.get_protocol("fake") is Fake
+    try:
+        type_defaultProtocol.create("fake", "key")
+    except Exception as error:
+        assert TypeError == type(error) # abstract methods are not implemented
+
+    type_defaultProtocol.register("fake", "json:JSONDecoder")
+    try:
+        type_defaultProtocol.get_protocol("fake")
+    except Exception as error:
+        assert TypeError == type(error)
+
+    try:
+        type_defaultProtocol.get_protocol("nowhere")
+    except Exception as error:
+        assert KeyError == type(error)
+
+    protocol = type_defaultProtocol.create("5sim", "key")
+    assert isinstance(protocol, type_defaultProtocol.Type_defaultProtocol) and protocol.name == "5sim"
+    assert type_defaultProtocol.get_protocol("5sim-async").name == "5sim-async"
+
+class FakeProvider:
+    """Protocol answering buy after :delay:, with :error: if given"""
+    name = "fake"
+
+    def __init__(self, delay: float = 0, error: Exception = None):
+        self.delay = delay
+        self.error = error
+        self.canceled = []
+
+    def buy(self, product, country, operator):
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+
+        return SimOrder({"id": id(self), "product": product, "status": "PENDING"}).set_protocol(self)
+
+    def cancel(self, id, into = None):
+        self.canceled.append(id)
+        return into
+
+def test_dispatcher_hedges():
+    slow, fast = FakeProvider(delay=0.3), FakeProvider(delay=0.01)
+    dispatcher = Dispatcher([slow, fast], hedge_after=0.05)
+
+    order = dispatcher.buy("tinder")
+    assert order.protocol is fast
+
+    time.sleep(0.4) # slow answers later and its order is canceled
+    assert slow.canceled == [id(slow)] and fast.canceled == []
+    assert [report["calls"] for report in dispatcher.report().values()] == [1, 1]
+    dispatcher.close()
+
+class AsyncFakeProvider(FakeProvider):
+    """Async :class:`FakeProvider`"""
+    async def buy(self, product, country, operator):
+        await asyncio.sleep(self.delay)
+        return AsyncSimOrder({"id": id(self), "product": product, "status": "PENDING"}).set_protocol(self)
+
+    async def cancel(self, id, into = None):
+        self.canceled.append(id)
+        return into
+
+def test_dispatcher_caller_cancelled():
+    async def main():
+        slow, slower = AsyncFakeProvider(delay=0.1), AsyncFakeProvider(delay=0.15)
+        dispatcher = AsyncDispatcher([slow, slower], hedge_after=0.01)
+
+        try:
+            await asyncio.wait_for(dispatcher.buy("tinder"), timeout=0.05)
+        except Exception as error:
+            assert asyncio.TimeoutError == type(error)
+
+        await asyncio.sleep(0.2) # both hedged orders come after caller is gone and are canceled
+        assert slow.canceled == [id(slow)] and slower.canceled == [id(slower)]
+        assert not dispatcher.cancels
+
+    asyncio.run(main())
+
+def test_dispatcher_failover():
+    offline, backup = FakeProvider(error=ServerOfflineError("Server is offline")), FakeProvider()
+    dispatcher = Dispatcher([offline, backup], hedge_after=10)
+
+    started = time.monotonic()
+    for _ in range(3):
+        assert dispatcher.buy("tinder").protocol is backup
+    assert time.monotonic() - started < 1 # no wait for budget after error
+
+    assert dispatcher.providers[0].error_rate == 1.0
+    assert dispatcher.rank()[0].protocol is backup # offline is tried last now
+
+    backup.error = NoFreePhonesError("No free phones")
+    try:
+        dispatcher.buy("tinder")
+    except Exception as error:
+        assert ServerOfflineError == type(error) # error of last tried provider
+    dispatcher.close()
@@ -0,0 +1,182 @@
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import threading
+import time
+
+from pysim.logger import log
+from metrics import endpoint
+
+# methods not wrapped by traced(), they return streams instead of doing requests
+UNTRACED = frozenset(("close", "events"))
+
+# span of running protocol call or request, children attach to it
+_current = contextvars.ContextVar("pysim_span", default=None)
+
+
+class Span:
+    """One protocol call ("call") or http request ("request") seen by :class:`Tracer` hooks..
+    :endpoint: is url template of request, call gets one of its first request.
+    :elapsed: :status: and :error: (exception class name) are set when span is finished.
+    """
+    __slots__ = ("kind", "name", "url", "endpoint", "started", "elapsed", "status", "error", "children", "sampled", "_perf", "_token")
+
+    def __init__(self, kind: str, name: str, url: str = None):
+        self.kind = kind
+        self.name = str.__str__(name) # plain str of ReqType
+        self.url = url
+        self.endpoint = endpoint(url) if url else None
+        self.started = time.time()
+        self.elapsed = None
+        self.status = None
+        self.error = None
+        self.children = []
+        self.sampled = False
+        self._perf = time.perf_counter()
+        self._token = None
+
+    def to_dict(self) -> dict:
+        """Compact trace: {"k": kind, "n": name, "e": endpoint, "t": started, "d": elapsed ms, "s": status, "x": error, "c": children}"""
+        trace = {"k": self.kind, "n": self.name, "e": self.endpoint, "t": round(self.started, 6), "d": round(self.elapsed * 1000, 3)}
+        if self.status is not None:
+            trace["s"] = self.status
+        if self.error is not None:
+            trace["x"] = self.error
+        if self.children:
+            trace["c"] = [child.to_dict() for child in self.children]
+
+        return trace
+
+
+class Tracer:
+    """Hooks around :class:`Session` requests and protocol methods..
+    Before hooks get started :class:`Span`, after hooks get finished one.
+    Sampling writes full trace (call with its nested calls and requests) of every :sample: th
+    top level call to :path: as json lines, see :meth:`Span.to_dict`.\n
+
+    :before: (optional) Callables of started span.\n
+    :after: (optional) Callables of finished span.\n
+    :sample: Write 1 of :sample: traces, 0 - no sampling.\n
+    :path: File of sampled traces.\n
+
+    :usage:
+        tracer = Tracer(after=[lambda span: print(span.endpoint, span.elapsed)], sample=100)
+        protocol = Type_5simProtocol(key, tracer=tracer)
+    """
+    def __init__(self, before: list = None, after: list = None, sample: int = 0, path: str = "pysim_traces.jsonl"):
+        self.before = list(before or [])
+        self.after = list(after or [])
+        self.sample = sample
+        self.path = path
+
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._file = None
+
+    def hook(self, before = None, after = None) -> None:
+        if before is not None:
+            self.before.append(before)
+        if after is not None:
+            self.after.append(after)
+
+    def run(self, hooks: list, span: Span) -> None:
+        for hook in hooks:
+            try:
+                hook(span)
+            except Exception as error: # broken hook must not break requests
+                log.info(f"Trace hook {hook!r} failed: {error!r}")
+
+    def start(self, kind: str, name: str, url: str = None) -> Span:
+        span = Span(kind, name, url)
+        parent = _current.get()
+        if parent is None:
+            span.sampled = bool(self.sample) and next(self._counter) % self.sample == 0
+        elif parent.sampled:
+            span.sampled = True
+            parent.children.append(span)
+
+        span._token = _current.set(span)
+        self.run(self.before, span)
+
+        return span
+
+    def finish(self, span: Span, status: int = None, error: Exception = None) -> None:
+        span.elapsed = time.perf_counter() - span._perf
+        span.status = status
+        span.error = type(error).__name__ if error is not None else None
+
+        _current.reset(span._token)
+        parent = _current.get()
+        if parent is not None and parent.endpoint is None:
+            parent.endpoint = span.endpoint
+
+        self.run(self.after, span)
+        if span.sampled and parent is None:
+            self.write(span)
+
+    def write(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def traced(cls: type) -> type:
+    """Class decorator: public methods of :cls: run in "call" span of its :tracer:..
+    Methods returning iterators (iter_*, UNTRACED) are not wrapped.
+    Without tracer method is called directly.
+    """
+    def wrap(name: str, method):
+        if inspect.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def wrapper(self, *args, **kwargs):
+                tracer = self.tracer
+                if tracer is None:
+                    return await method(self, *args, **kwargs)
+
+                span = tracer.start("call", name)
+                try:
+                    result = await method(self, *args, **kwargs)
+                except BaseException as error:
+                    tracer.finish(span, error=error)
+                    raise
+
+                tracer.finish(span)
+                return result
+        else:
+            @functools.wraps(method)
+            def wrapper(self, *args, **kwargs):
+                tracer = self.tracer
+                if tracer is None:
+                    return method(self, *args, **kwargs)
+
+                span = tracer.start("call", name)
+                try:
+                    result = method(self, *args, **kwargs)
+                except BaseException as error:
+                    tracer.finish(span, error=error)
+                    raise
+
+                tracer.finish(span)
+                return result
+
+        return wrapper
+
+    for name, method in list(vars(cls).items()):
+        if name.startswith(("_", "iter_")) or name in UNTRACED or not inspect.isfunction(method):
+            continue
+        if inspect.isgeneratorfunction(method) or inspect.isasyncgenfunction(method):
+            continue
+        setattr(cls, name, wrap(name, method))
+
+    return cls
@@ -0,0 +1,88 @@
+import importlib
+from abc import ABC, abstractmethod
+
+from data import Service, Country, Operator, Product, OrderId
+
+# provider name -> "module:Class", module is imported on first use
+PROVIDERS = {
+    "5sim": "type_5simProtocol:Type_5simProtocol",
+    "5sim-async": "type_5simAsyncProtocol:AsyncType_5simProtocol",
+}
+
+_classes = {} # provider name -> imported protocol class
+
+
+class Type_defaultProtocol(Service, ABC):
+    """Common interface of sms-service protocols..
+    Every provider implements these methods, async providers implement them as coroutines.
+    Orders are returned as :class:`SimOrder` (or its subclass) bound to protocol.
+    Constructor takes api key first: Protocol(key, **options).\n
+
+    :name: Provider name in registry.\n
+    """
+    name = None
+
+    @abstractmethod
+    def balance(self) -> dict:
+        """Profile of account with its balance"""
+
+    @abstractmethod
+    def prices(self, country: Country = None, product: Product = None) -> dict:
+        """{country: {product: {operator: {"cost", "count"}}}}, by product - {product: {country: ...}}"""
+
+    @abstractmethod
+    def buy(self, product: Product, country: Country = Country.ANY, operator: Operator = Operator.ANY, **kwargs):
+        """Buy activation number, returns :class:`SimOrder`"""
+
+    @abstractmethod
+    def check(self, id: OrderId, into = None):
+        """Refresh order, :into: is :class:`SimOrder` updated in place"""
+
+    @abstractmethod
+    def cancel(self, id: OrderId, into = None):
+        """Cancel order, returns :class:`SimOrder`"""
+
+    @abstractmethod
+    def finish(self, id: OrderId, into = None):
+        """Finish order, returns :class:`SimOrder`"""
+
+    @abstractmethod
+    def ban(self, id: OrderId, into = None):
+        """Ban number of order, returns :class:`SimOrder`"""
+
+
+def register(name: str, protocol) -> None:
+    """Add provider, :protocol: is class or "module:Class" imported on first use"""
+    PROVIDERS[name] = protocol
+    _classes.pop(name, None)
+
+
+def providers() -> list:
+    return list(PROVIDERS)
+
+
+def get_protocol(name: str) -> type:
+    """Protocol class of provider, imports its module on first call"""
+    protocol = _classes.get(name)
+    if protocol is not None:
+        return protocol
+
+    try:
+        protocol = PROVIDERS[name]
+    except KeyError:
+        raise KeyError(f"Unknown provider {name!r}, registered: {', '.join(PROVIDERS)}") from None
+
+    if isinstance(protocol, str):
+        module, _, attribute = protocol.partition(":")
+        protocol = getattr(importlib.import_module(module), attribute)
+
+    if not issubclass(protocol, Type_defaultProtocol):
+        raise TypeError(f"Provider {name!r} does not implement Type_defaultProtocol")
+
+    _classes[name] = protocol
+    return protocol
+
+
+def create(name: str, *args, **kwargs) -> Type_defaultProtocol:
+    """Protocol of provider: create("5sim", key=APIKEY)"""
+    return get_protocol(name)(*args, **kwargs)